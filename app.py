@@ -11,11 +11,17 @@ import src.visualization.plots as pl
 import src.strategy.predictor as sp
 import src.strategy.race_engine as sr
 import src.strategy.optimizer as so
+import src.strategy.cache as sc
+import src.strategy.parameter_store as ps
 import src.visualization.utils as vu
 import src.visualization.theme as vt
 import src.analysis.lap_metrics as al
 import src.analysis.driver_performance as ad
+import src.diagnostics.metrics as dm
 import pandas as pd
+import itertools
+import logging
+import time
 
 # ==========================
 # INITIAL SETUP
@@ -25,6 +31,24 @@ st.title("🏎️ F1 Driver Performance Dashboard")
 
 sd.setup_fastf1_cache()
 
+# Progress of the data modules is reported through logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# Fitted tyre models persisted across runs (race-day reruns start from Friday's fits)
+PARAMETER_STORE = ps.ParameterStore()
+
+# Data each feature needs from a session (lighter profiles load faster, the cached session is upgraded on demand)
+FEATURE_PROFILES = {
+    "Circuit Map": "telemetry",
+    "Speed Comparison": "telemetry",
+    "Position Changes": "laps",
+    "Driver Analysis": "laps",
+    "Race Strategy Engine": "laps",
+}
+
+# Fixed Monte Carlo seed: identical inputs give identical (and cacheable) strategy rankings
+STRATEGY_SEED = 0
+
 # ==========================
 # SIDEBAR — FEATURE SELECTION
 # ==========================
@@ -57,7 +81,7 @@ if feature in ["Speed Comparison", "Circuit Map", "Position Changes", "Race Stra
 
     if st.sidebar.button("Load Session"):
         with st.spinner("Loading FastF1 session..."):
-            session = sd.loading_FastF1_session(year, gp_name, session_type)
+            session = sd.loading_FastF1_session(year, gp_name, session_type, profile=FEATURE_PROFILES[feature])
             if session is None:
                 st.error("Failed to load session. Please check the season, Grand Prix name, and session type.")
             else:
@@ -67,12 +91,21 @@ if feature in ["Speed Comparison", "Circuit Map", "Position Changes", "Race Stra
                         st.error("⚠️ This session hasn't happened yet! Please select a past session.")
                     else:
                         st.session_state.session = session
+                        st.session_state.session_key = (year, gp_name, session_type)
                         st.success("Session loaded successfully!")
                 except Exception as e:
                     st.error(f"Failed to validate session date: {e}")
+
+    # Sessions are loaded once per server process and shared between users
+    cache_stats = sd.SESSION_CACHE.stats()
+    st.sidebar.caption(
+        f"Session cache: {cache_stats['size']} loaded ({cache_stats['bytes'] / 1024 ** 2:.0f} / {cache_stats['max_bytes'] / 1024 ** 2:.0f} MB), "
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['upgrades']} upgrades, {cache_stats['evictions']} evictions"
+    )
 else:
     # Clear session state if not needed for the selected feature
     st.session_state.pop("session", None)
+    st.session_state.pop("session_key", None)
 
 # ==========================
 # SIDEBAR — THEME SELECTION
@@ -86,6 +119,23 @@ if feature in ["Speed Comparison", "Circuit Map"]:
 else:
     theme = None
 
+# ==========================
+# SIDEBAR — DIAGNOSTICS
+# ==========================
+# Process-wide timings of loading, analysis, strategy and plotting steps (JSON lines go to F1_METRICS_FILE if set).
+# The checkbox only shows the panel of this user; recording is shared by every user, so it is only ever switched on
+# (F1_METRICS=1 at startup or the buttons below) and never off by an unticked checkbox
+st.sidebar.divider()
+diagnostics = st.sidebar.checkbox("🩺 Diagnostics", value=False, help="Show how long each step of an interaction takes.")
+if diagnostics and not dm.is_enabled():
+    st.sidebar.caption("Recording is off for this server (set F1_METRICS=1 to record from startup).")
+    if st.sidebar.button("Start recording"):
+        dm.configure(enabled=True)
+if diagnostics and dm.is_enabled() and not dm.is_tracing_memory():
+    if st.sidebar.button("Track memory peaks (slower)"):
+        dm.configure(trace_memory=True)
+diagnostics_panel = st.sidebar.container()
+
 # ==========================
 # OVERVIEW
 # ==========================
@@ -122,11 +172,17 @@ elif feature == "Circuit Map":
         st.info("👈 Load a session first.")
     else:
         
-        # Get circuit info and plot map
-        session = st.session_state.session
+        # Get circuit info and plot map (position data is loaded on first use)
+        with st.spinner("Loading position data..."):
+            session = sd.loading_FastF1_session(*st.session_state.session_key, profile="telemetry")
+        if session is None:
+            st.error("Failed to load position data for this session.")
+            st.stop()
+        st.session_state.session = session
         circuit_info = session.get_circuit_info()
         fig = pl.plot_circuit_map(circuit_info, session, theme)
-        st.pyplot(fig)
+        with dm.span("render.pyplot"):
+            st.pyplot(fig)
 
 # ==========================
 # SPEED COMPARISON
@@ -163,8 +219,14 @@ elif feature == "Speed Comparison":
         # Generate comparison on button click
         if st.button("Generate Comparison", key="speed_comp_button"):
             with st.spinner("Analyzing telemetry..."):
-                best1 = session.laps.pick_drivers(driver1).pick_fastest()
-                best2 = session.laps.pick_drivers(driver2).pick_fastest()
+                session = sd.loading_FastF1_session(*st.session_state.session_key, profile="telemetry")
+                if session is None:
+                    st.error("Failed to load telemetry for this session.")
+                    st.stop()
+                st.session_state.session = session
+                with dm.span("laps.pick_drivers"):
+                    best1 = session.laps.pick_drivers(driver1).pick_fastest()
+                    best2 = session.laps.pick_drivers(driver2).pick_fastest()
 
                 if not dd.laps_verification(best1, best2):
                     st.error("Invalid or missing lap data for selected drivers.")
@@ -185,7 +247,8 @@ elif feature == "Speed Comparison":
         if st.session_state.comparison_data is not None:
             data = st.session_state.comparison_data
             fig = pl.plot_speed_comparison(data["tel1"], data["tel2"], driver1, driver2, year, gp_name, session_type, data["circuit_info"], theme)
-            st.pyplot(fig)
+            with dm.span("render.pyplot"):
+                st.pyplot(fig)
 
             # Metrics for lap times
             m1, m2 = st.columns(2)
@@ -227,7 +290,8 @@ elif feature == "Position Changes":
     else:
         session = st.session_state.session
         fig = pl.plot_position_changes(session)
-        st.pyplot(fig)
+        with dm.span("render.pyplot"):
+            st.pyplot(fig)
 
 # ==========================
 # DRIVER ANALYSIS  
@@ -253,7 +317,8 @@ elif feature == "Driver Analysis":
 
         if st.button("Analyze Driver"):
 
-            raw_laps = session.laps.pick_driver(driver)
+            with dm.span("laps.pick_drivers"):
+                raw_laps = session.laps.pick_driver(driver)
 
             clean_laps = (raw_laps.pick_quicklaps().dropna(subset=["LapTime"]))
             clean_laps = clean_laps[clean_laps["LapTime"] < clean_laps["LapTime"].quantile(0.95)]
@@ -337,7 +402,8 @@ elif feature == "Driver Analysis":
             # ======================
             st.subheader("📈 Lap Time Analysis")
 
-            raw_laps = session.laps.pick_driver(driver)
+            with dm.span("laps.pick_drivers"):
+                raw_laps = session.laps.pick_driver(driver)
 
             lap_data = raw_laps[["LapNumber", "LapTime"]].dropna()
 
@@ -405,19 +471,61 @@ elif feature == "Race Strategy Engine":
 
         race_laps = st.session_state.race_laps
 
+        # Maximum number of pit stops (1 = classic 1-stop search)
+        max_stops = st.number_input(
+            "Maximum pit stops",
+            min_value=1,
+            max_value=3,
+            value=1,
+            help="Search strategies with up to this many pit stops."
+        )
+
+        # Spend Monte Carlo runs on contenders only (1-stop search)
+        adaptive = st.checkbox(
+            "Adaptive simulation budget",
+            value=False,
+            help="Stop simulating strategies that are clearly off the lead and focus on the contenders."
+        )
+
+        # Long runs of every practice session of the weekend (loaded concurrently)
+        all_practice = st.checkbox(
+            "Use all practice sessions (FP1–FP3)",
+            value=False,
+            help="Fit the tyre model on the long runs of FP1, FP2 and FP3 together."
+        )
+
         # Run strategy optimization on button click
         if st.button("Run Strategy Optimization"):
 
+            # Build practice sessions dictionary
+            sessions = {session.name: session}
+            if all_practice:
+                session_year, session_gp, _ = st.session_state.session_key
+                futures = sd.load_sessions_async(session_year, session_gp, ["FP1", "FP2", "FP3"], profile="laps")
+
+                # Poll the background loads so that the page shows where each session stands
+                progress_text = st.empty()
+                while not all(future.done() for future in futures.values()):
+                    stages = [f"{session_type}: {sd.SESSION_LOADER.progress(session_year, session_gp, session_type)}" for session_type in futures]
+                    progress_text.caption("⏳ Loading practice sessions — " + " | ".join(stages))
+                    time.sleep(0.2)
+                progress_text.empty()
+
+                loaded = [future.result() for future in futures.values()]
+                sessions = {practice.name: practice for practice in loaded if practice is not None}
+
             with st.spinner("Building predictive model..."):
 
-                # Build practice sessions dictionary.
-                # Designed to support multiple sessions in the future, but currently using only the selected session.
-                sessions = {session.name: session}
                 st.caption(f"📊 Model built using: {', '.join(sessions.keys())}")
 
-                # Predictor
-                predictor = sp.Predictor(sessions, driver)
-                params = predictor.get_parameters()
+                # Stored fit first; otherwise fit the whole grid once and persist every driver
+                event_name = session.event["EventName"]
+                sessions_name = " + ".join(sessions.keys())
+                params = PARAMETER_STORE.load(year, event_name, sessions_name, driver)
+                if params is None:
+                    grid = sp.get_grid_predictor(sessions)
+                    PARAMETER_STORE.save_many(year, event_name, sessions_name, {d: grid.get_driver_parameters(d) for d in drivers})
+                    params = grid.get_driver_parameters(driver)
                 if not params:
                     st.error("Not enough long-run data to build a model.")
                     st.stop()
@@ -425,12 +533,43 @@ elif feature == "Race Strategy Engine":
                 # Engine
                 engine = sr.RaceEngine(parameters=params, race_laps=race_laps)
 
-                # Optimizer
-                optimizer = so.StrategyOptimizer(engine)
+                # Optimizer (evaluations are shared across reruns through the process-wide cache)
+                optimizer = so.StrategyOptimizer(engine, cache=sc.STRATEGY_CACHE)
 
-                # Optimize 1-stop strategies
-                results = optimizer.optimize_1stop(available_compounds=list(params.keys()), min_pit_lap=10, max_pit_lap=race_laps - 1)
-                if not results:
+                st.subheader("🏆 Top 5 Strategies")
+                best_time = None
+
+                # Timed from the optimizer call: 1-stop searches finish before the loop, multi-stop leaders are streamed in it
+                with dm.span("strategy.search"):
+
+                    # Optimize 1-stop strategies, or stream multi-stop leaders from the branch-and-bound search
+                    if max_stops == 1 and adaptive:
+                        results = optimizer.optimize_1stop_adaptive(available_compounds=list(params.keys()), min_pit_lap=10, max_pit_lap=race_laps - 1, seed=STRATEGY_SEED)
+                    elif max_stops == 1:
+                        results = optimizer.optimize_1stop(available_compounds=list(params.keys()), min_pit_lap=10, max_pit_lap=race_laps - 1, seed=STRATEGY_SEED, common_random_numbers=True)
+                    else:
+                        results = optimizer.iter_top_k(available_compounds=list(params.keys()), min_pit_lap=10, max_pit_lap=race_laps - 1, top_k=5, max_stops=max_stops, seed=STRATEGY_SEED)
+
+                    # Leaders are written as soon as they are confirmed
+                    for i, strat in enumerate(itertools.islice(results, 5), 1):
+                        if best_time is None:
+                            best_time = strat["total_time"]
+                        delta = strat["total_time"] - best_time
+                        pit_laps = strat["pit_laps"] if "pit_laps" in strat else [strat["pit_lap"]]
+
+                        st.write(
+                            f"**{i}. {' → '.join(strat['compounds'])}**  |  "
+                            f"Pit Lap{'s' if len(pit_laps) > 1 else ''}: {', '.join(str(lap) for lap in pit_laps)}  |  "
+                            f"Total: {vu.format_total(strat['total_time'])}  |  "
+                            f"Δ {vu.format_delta(delta)}"
+                            + (f" ± {strat['delta_std_error']:.2f}s" if strat.get("delta_std_error") else "")
+                        )
+
+                # The multi-stop pool reached its cap before the pruning bound could rule out the remaining strategies
+                if max_stops > 1 and optimizer.last_search_stats.get("truncated"):
+                    st.caption("⚠️ Search stopped at the candidate pool limit, unconfirmed strategies may not be the fastest.")
+
+                if best_time is None:
                     if len(params) < 2:
                         st.warning(
                             "⚠️ Strategy optimization cannot be performed because only one tyre compound "
@@ -441,19 +580,6 @@ elif feature == "Race Strategy Engine":
                         st.error("No valid strategies could be generated with the available data.")
                     st.stop()
 
-                st.subheader("🏆 Top 5 Strategies")
-                best_time = results[0]["total_time"]
-
-                for i, strat in enumerate(results[:5], 1):
-                    delta = strat["total_time"] - best_time
-
-                    st.write(
-                        f"**{i}. {strat['compounds'][0]} → {strat['compounds'][1]}**  |  "
-                        f"Pit Lap: {strat['pit_lap']}  |  "
-                        f"Total: {vu.format_total(strat['total_time'])}  |  "
-                        f"Δ {vu.format_delta(delta)}"
-                    )
-
 
 # ==========================
 #  CHAMPIONSHIP SCENARIO (COMING SOON)
@@ -481,4 +607,17 @@ elif feature == "Championship Scenario (Coming soon)":
         This module will transform single-race analysis into
         a full-season strategic projection tool.
         """
-    )    
\ No newline at end of file
+    )    
+
+# ==========================
+# SIDEBAR — DIAGNOSTICS SUMMARY
+# ==========================
+if diagnostics:
+    with diagnostics_panel:
+        rows = dm.summary()
+        if rows:
+            st.dataframe(pd.DataFrame(rows).round(2), hide_index=True)
+        else:
+            st.caption("No operation recorded yet.")
+        if st.button("Reset metrics"):
+            dm.reset()
@@ -4,6 +4,7 @@
 
 # === Imports ===
 import pandas as pd
+from src.diagnostics import metrics as dm
 
 
 # Function to generate a human-readable performance insight based on the potential gain metric
@@ -72,6 +73,7 @@ def sector_strengths(sectors: dict) -> dict:
 # Output: dict containing insights, score, sector analysis, and lap trend
 # Precondition: laps DataFrame contains necessary time columns, summary dictionary contains all required metrics
 # Postcondition: a dictionary is returned that compiles a comprehensive report on the driver's performance, including a human-readable insight, a performance score, analysis of sector strengths and weaknesses, and a trend
+@dm.timed("analysis.full_driver_report")
 def full_driver_report(laps: pd.DataFrame, summary: dict) -> dict:
 
     return {
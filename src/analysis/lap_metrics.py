@@ -3,7 +3,14 @@
 #DESCRIPTION : Lap performance metrics for F1 Driver Performance Dashboard
 
 # === Imports ===
+import numpy as np
 import pandas as pd
+from src.diagnostics import metrics as dm
+
+# Sector time columns, in order
+SECTOR_COLUMNS = ['Sector1Time', 'Sector2Time', 'Sector3Time']
+# int64 value of NaT in a timedelta64[ns] array
+NAT_NANOSECONDS = np.iinfo(np.int64).min
 
 # Function to ensure time columns are in Timedelta format
 # Input: series (pd.Series)
@@ -95,18 +102,106 @@ def best_sectors(laps: pd.DataFrame):
         "S3": laps['Sector3Time'].min(),
     }
 
+# Function to convert a time column once to int64 nanoseconds
+# Input: series (pd.Series of times as strings or Timedelta)
+# Output: (int64 nanoseconds array, boolean mask of valid values)
+# Precondition: series can be parsed by pd.to_timedelta
+# Postcondition: NaT entries are excluded by the mask
+def _nanoseconds(series: pd.Series):
+    values = pd.to_timedelta(series).to_numpy(dtype="timedelta64[ns]").view(np.int64)
+    return values, values != NAT_NANOSECONDS
+
+
+# Function to convert a float or int nanosecond result back to a Timedelta
+# Input: value (float or int nanoseconds, NaN for missing)
+# Output: Timedelta or NaT
+# Precondition: none
+# Postcondition: truncated toward zero to whole nanoseconds, like pandas timedelta reductions
+def _timedelta(value) -> pd.Timedelta:
+    if np.isnan(value):
+        return pd.NaT
+    return pd.Timedelta(int(np.int64(value)), unit="ns")
+
+
+# Function to compute min, mean and sample standard deviation of int64 nanoseconds in one pass over the valid values
+# Input: values (int64 array), valid (boolean mask)
+# Output: (min, mean, std) as float nanoseconds (NaN when undefined)
+# Precondition: none
+# Postcondition: mean and std follow pandas (float64 sums, two-pass variance, ddof=1, NaN below two values)
+def _time_moments(values: np.ndarray, valid: np.ndarray):
+    data = values[valid]
+    count = data.size
+    if count == 0:
+        return np.nan, np.nan, np.nan
+
+    mean = data.sum(dtype=np.float64) / count
+    std = np.sqrt(((mean - data) ** 2).sum(dtype=np.float64) / (count - 1)) if count > 1 else np.nan
+    return float(data.min()), mean, std
+
+
+# Function to compute the minimum of int64 nanoseconds over the valid values
+# Input: values (int64 array), valid (boolean mask)
+# Output: minimum as float nanoseconds (NaN if no valid value)
+# Precondition: none
+# Postcondition: none
+def _time_min(values: np.ndarray, valid: np.ndarray) -> float:
+    return float(values[valid].min()) if valid.any() else np.nan
+
+
 # Function to generate a full summary of lap performance metrics for a driver
 # Input: laps (pd.DataFrame)
 # Output: dictionary containing all lap performance metrics
 # Precondition: laps DataFrame contains necessary time columns for all metric calculations
 # Postcondition: dictionary is returned with keys for each metric (best lap, theoretical best, potential gain, consistency, average lap time, best sectors) and corresponding values representing the calculated metrics,
+@dm.timed("analysis.full_driver_summary")
 def full_driver_summary(laps: pd.DataFrame):
 
+    # Each time column is converted once, every metric then works on int64 nanoseconds
+    columns = [_nanoseconds(laps[column]) for column in ['LapTime'] + SECTOR_COLUMNS]
+    return _summary_from_nanoseconds(columns)
+
+
+# Function to build the summary dict from converted time columns
+# Input: columns (list of (int64 nanoseconds, valid mask) for LapTime and Sector1-3Time)
+# Output: dictionary with the full_driver_summary keys
+# Precondition: arrays of all columns have the same length
+# Postcondition: values match the per-metric helpers (best_lap, theoretical_best_lap, potential_gain, consistency_score,
+#                average_lap_time, best_sectors)
+def _summary_from_nanoseconds(columns: list) -> dict:
+    lap_best, lap_mean, lap_std = _time_moments(*columns[0])
+    sector_best = [_time_min(values, valid) for values, valid in columns[1:]]
+
+    best = _timedelta(lap_best)
+    theoretical = _timedelta(sum(sector_best))
+
     return {
-        "best_lap": best_lap(laps),
-        "theoretical_best": theoretical_best_lap(laps),
-        "potential_gain": potential_gain(laps),
-        "consistency": consistency_score(laps),
-        "average_lap": average_lap_time(laps),
-        "best_sectors": best_sectors(laps),
-    }
\ No newline at end of file
+        "best_lap": best,
+        "theoretical_best": theoretical,
+        "potential_gain": best - theoretical,
+        "consistency": _timedelta(lap_std),
+        "average_lap": _timedelta(lap_mean),
+        "best_sectors": {f"S{i}": _timedelta(value) for i, value in enumerate(sector_best, 1)},
+    }
+
+
+# Function to generate the full summary of every driver (e.g. a whole grid or season) at once
+# Input: laps (pd.DataFrame with a 'Driver' column), by (str, grouping column)
+# Output: dict of driver -> full_driver_summary dict
+# Precondition: laps DataFrame contains the LapTime and sector time columns
+# Postcondition: time columns are converted once for all drivers; each driver is a contiguous slice after one stable sort
+@dm.timed("analysis.grid_driver_summaries")
+def grid_driver_summaries(laps: pd.DataFrame, by: str = "Driver") -> dict:
+
+    codes, drivers = pd.factorize(laps[by])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(drivers) + 1))
+
+    columns = []
+    for column in ['LapTime'] + SECTOR_COLUMNS:
+        values, valid = _nanoseconds(laps[column])
+        columns.append((values[order], valid[order]))
+
+    return {
+        driver: _summary_from_nanoseconds([(values[start:end], valid[start:end]) for values, valid in columns])
+        for driver, start, end in zip(drivers, bounds[:-1], bounds[1:])
+    }
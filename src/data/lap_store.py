@@ -0,0 +1,194 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Compact columnar lap cache (Arrow IPC files) for the columns the dashboard reads
+
+# === Imports ===
+from typing import Dict, List, Optional, Union
+import json
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import fastf1.plotting
+from src.diagnostics import metrics as dm
+
+logger = logging.getLogger(__name__)
+
+# Default directory of the stored sessions, next to the FastF1 cache
+DEFAULT_STORE_DIR = os.path.join("cache", "laps")
+# Bump when the stored columns, dtypes or metadata change, older files are then re-exported
+STORE_VERSION = 2
+
+# Columns kept from Session.laps and their on-disk dtype
+TIME_COLUMNS = ["LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]
+CATEGORY_COLUMNS = ["Driver", "DriverNumber", "Team", "Compound", "TrackStatus"]
+INTEGER_COLUMNS = {"LapNumber": "Int16", "Stint": "Int8", "Position": "Int8"}
+LAP_COLUMNS = ["Driver", "DriverNumber", "Team", "LapNumber", "Stint", "Compound", "TrackStatus", "Position"] + TIME_COLUMNS
+
+# Same default as fastf1.core.Laps.pick_quicklaps
+QUICKLAP_THRESHOLD = 1.07
+
+
+# Lap table read from the store, with the Laps selection helpers used by the dashboard.
+class StoredLaps(pd.DataFrame):
+
+    # Keep the subclass through slicing and filtering
+    @property
+    def _constructor(self):
+        return StoredLaps
+
+    # Select the laps of one or several drivers
+    # Input: identifiers (driver abbreviation or number, or a list of them)
+    # Output: StoredLaps
+    # Precondition: none
+    # Postcondition: same semantics as fastf1 Laps.pick_drivers
+    def pick_drivers(self, identifiers: Union[str, int, List]) -> "StoredLaps":
+        if not isinstance(identifiers, (list, tuple, set)):
+            identifiers = [identifiers]
+        identifiers = [str(identifier) for identifier in identifiers]
+        return self[self["Driver"].isin(identifiers) | self["DriverNumber"].isin(identifiers)]
+
+    # Select the laps of one driver (kept for compatibility with fastf1 Laps.pick_driver)
+    # Input: identifier (driver abbreviation or number)
+    # Output: StoredLaps
+    # Precondition: none
+    # Postcondition: same as pick_drivers(identifier)
+    def pick_driver(self, identifier: Union[str, int]) -> "StoredLaps":
+        return self.pick_drivers(identifier)
+
+    # Select the laps faster than a fraction of the best lap
+    # Input: threshold (float, optional, default QUICKLAP_THRESHOLD)
+    # Output: StoredLaps
+    # Precondition: none
+    # Postcondition: same semantics as fastf1 Laps.pick_quicklaps
+    def pick_quicklaps(self, threshold: Optional[float] = None) -> "StoredLaps":
+        if threshold is None:
+            threshold = QUICKLAP_THRESHOLD
+        return self[self["LapTime"] < self["LapTime"].min() * threshold]
+
+
+# Session opened from the store: the attributes of fastf1 Session read by the lap-based features.
+class StoredSession:
+
+    # Constructor
+    # Input: laps (StoredLaps), metadata (dict with name, event_name, year, date, drivers, driver_styles)
+    # Output: StoredSession object
+    # Precondition: metadata was written by export_session
+    # Postcondition: name, event, date, drivers and laps mirror the exported session, driver_styles holds the
+    #                fastf1 plotting style (color, linestyle) of each driver abbreviation
+    def __init__(self, laps: StoredLaps, metadata: Dict):
+        self.laps = laps
+        self.name = metadata["name"]
+        self.event = pd.Series({"EventName": metadata["event_name"], "year": metadata["year"]})
+        self.date = pd.Timestamp(metadata["date"]) if metadata.get("date") else None
+        self.drivers = list(metadata["drivers"])
+        self.driver_styles = dict(metadata.get("driver_styles") or {})
+
+
+# Function to shrink a laps table to the stored columns and compact dtypes
+# Input: laps (DataFrame / fastf1 Laps)
+# Output: DataFrame with categorical labels, int32 milliseconds for times and narrow nullable integers
+# Precondition: laps contains the LAP_COLUMNS (missing ones are stored empty)
+# Postcondition: times keep millisecond precision, missing values stay missing
+def compact_laps(laps: pd.DataFrame) -> pd.DataFrame:
+    compact = {}
+    for column in LAP_COLUMNS:
+        values = laps[column] if column in laps.columns else pd.Series(pd.NA, index=laps.index)
+        if column in TIME_COLUMNS:
+            milliseconds = pd.to_timedelta(values).dt.total_seconds() * 1000
+            compact[column] = milliseconds.round().astype("Int32")
+        elif column in INTEGER_COLUMNS:
+            compact[column] = pd.to_numeric(values).round().astype(INTEGER_COLUMNS[column])
+        else:
+            compact[column] = values.astype("string").astype("category")
+    return pd.DataFrame(compact).reset_index(drop=True)
+
+
+# Function to build the store path of a session
+# Input: year (int), gp_name (str), session_type (str), store_dir (str)
+# Output: file path (str)
+# Precondition: none
+# Postcondition: names are normalized like the session cache keys
+def store_path(year: int, gp_name: str, session_type: str, store_dir: str = DEFAULT_STORE_DIR) -> str:
+    name = f"{int(year)}_{gp_name.strip().lower()}_{session_type.strip().upper()}".replace(" ", "_")
+    return os.path.join(store_dir, f"{name}.arrow")
+
+
+# Function to compute the plotting style of every driver of a loaded session
+# Input: session (fastf1 Session with laps loaded)
+# Output: Dict[driver abbreviation -> dict with color and linestyle]
+# Precondition: none
+# Postcondition: same styles as fastf1.plotting.get_driver_style, drivers without team data are left out;
+#                empty when the team data cannot be loaded (the plots then use the default colors)
+def driver_styles(session) -> Dict[str, Dict[str, str]]:
+    styles = {}
+    try:
+        for abbreviation in session.laps["Driver"].dropna().unique():
+            try:
+                style = fastf1.plotting.get_driver_style(identifier=abbreviation, style=["color", "linestyle"], session=session)
+            except KeyError:
+                continue
+            styles[str(abbreviation)] = {option: str(value) for option, value in style.items()}
+    except Exception as e:
+        logger.warning("Error reading the driver styles of the session: %s", e)
+        return {}
+    return styles
+
+
+# Function to export the laps of a loaded session to the store
+# Input: session (fastf1 Session with laps loaded), path (str)
+# Output: none
+# Precondition: the parent directory of path is writable
+# Postcondition: an uncompressed Arrow IPC file is written atomically with the session metadata and driver styles
+@dm.timed("lap_store.export")
+def export_session(session, path: str) -> None:
+    table = pa.Table.from_pandas(compact_laps(session.laps), preserve_index=False)
+
+    session_date = getattr(session, "date", None)
+    metadata = {
+        "version": STORE_VERSION,
+        "name": session.name,
+        "event_name": session.event["EventName"],
+        "year": int(session.event.year) if hasattr(session.event, "year") else None,
+        "date": str(session_date) if session_date is not None else None,
+        "drivers": [str(driver) for driver in session.drivers],
+        "driver_styles": driver_styles(session),
+    }
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"lap_store": json.dumps(metadata).encode()})
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # Write next to the target then rename, readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+# Function to open a stored session
+# Input: path (str)
+# Output: StoredSession, or None if the file is missing or was written by another STORE_VERSION
+# Precondition: none
+# Postcondition: the file is read through a memory map without parsing, into a private pandas copy (labels stay
+#                categorical); times become Timedelta, nullable integers become float32 (NaN for missing) like fastf1 Laps
+@dm.timed("lap_store.open")
+def open_session(path: str) -> Optional[StoredSession]:
+    if not os.path.exists(path):
+        return None
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    metadata = json.loads((table.schema.metadata or {}).get(b"lap_store", b"{}"))
+    if metadata.get("version") != STORE_VERSION:
+        return None
+
+    frame = table.to_pandas()
+    for column in TIME_COLUMNS:
+        frame[column] = pd.to_timedelta(frame[column], unit="ms")
+    for column in INTEGER_COLUMNS:
+        frame[column] = frame[column].astype("float32")
+
+    return StoredSession(StoredLaps(frame), metadata)
@@ -4,18 +4,42 @@
 
 # === Imports ===
 import os
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+import pandas as pd
 import fastf1
+from fastf1 import _api as fastf1_api
 from fastf1.core import Session
+from src.data import lap_store as ls
+from src.data import shared_store as ss
+from src.diagnostics import metrics as dm
+
+# Data classes loaded by each profile, from the lightest to the most complete
+LOAD_PROFILES = {
+    "laps": {"laps": True, "telemetry": False, "weather": False, "messages": False},
+    "telemetry": {"laps": True, "telemetry": True, "weather": False, "messages": False},
+    "full": {"laps": True, "telemetry": True, "weather": True, "messages": True},
+}
+PROFILE_ORDER = list(LOAD_PROFILES)
+
+# Number of sessions parsed at the same time by the background loader
+MAX_CONCURRENT_LOADS = 3
+
+logger = logging.getLogger(__name__)
+
+# Memory budget of the process-wide session cache, overridable with the F1_SESSION_CACHE_MB environment variable
+DEFAULT_SESSION_CACHE_MB = 2048
 
 
 # Function to setup FastF1 cache
-# Input: none
+# Input: cache_dir (str)
 # Output: none
 # Precondition: none
 # Postcondition: FastF1 cache is set up
-def setup_fastf1_cache() -> None:
-    cache_dir = "cache"
+def setup_fastf1_cache(cache_dir: str = "cache") -> None:
 
     # Create cache directory if it doesn't exist
     if not os.path.exists(cache_dir):
@@ -25,36 +49,318 @@ def setup_fastf1_cache() -> None:
     fastf1.Cache.enable_cache(cache_dir)
 
 
-# Function to load FastF1 session 
-# Input: year, gp_name, session_type
+# Function to estimate the private memory of a DataFrame
+# Input: frame (DataFrame)
+# Output: size in bytes (int)
+# Precondition: none
+# Postcondition: read-only columns (views of a shared memory mapping, see shared_store) are not counted,
+#                their pages belong to every process
+def frame_private_bytes(frame: pd.DataFrame) -> int:
+    usage = frame.memory_usage(index=True, deep=True)
+    total = int(usage.sum())
+    for position, column in enumerate(frame.columns):
+        values = frame.iloc[:, position].to_numpy()
+        if values.dtype != object and not values.flags.writeable:
+            total -= int(usage.iloc[position + 1])
+    return total
+
+
+# Function to estimate the memory held by a loaded session
+# Input: session (Session)
+# Output: size in bytes (int)
+# Precondition: none
+# Postcondition: sums the private memory of the DataFrames held by the session (laps, results, weather, telemetry per driver, ...),
+#                telemetry attached from the shared store only counts its copied text columns
+def session_memory_usage(session: Session) -> int:
+    total = 0
+    for value in vars(session).values():
+        frames = value.values() if isinstance(value, dict) else [value]
+        for frame in frames:
+            if isinstance(frame, pd.DataFrame):
+                total += frame_private_bytes(frame)
+    return total
+
+
+# Process-wide LRU cache of loaded sessions, shared by every Streamlit rerun and user.
+# Sessions are shared objects: callers must treat them as read-only.
+class SessionCache:
+
+    # Constructor
+    # Input: max_bytes (int)
+    # Output: SessionCache object
+    # Precondition: max_bytes > 0
+    # Postcondition: empty cache with zeroed counters
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.upgrades = 0
+
+    # Build the cache key of a session
+    # Input: year (int), gp_name (str), session_type (str)
+    # Output: (year, gp, session_type) tuple
+    # Precondition: none
+    # Postcondition: "monza" / " Monza " and "fp2" / "FP2" give the same key
+    @staticmethod
+    def make_key(year: int, gp_name: str, session_type: str) -> Tuple[int, str, str]:
+        return (int(year), gp_name.strip().lower(), session_type.strip().upper())
+
+    # Return a cached session loaded with at least the given profile, or load it once even if several callers ask for it
+    # Input: key (from make_key), loader (callable taking a profile name and returning a Session or None), profile (str from LOAD_PROFILES)
+    # Output: Session or None if loading fails
+    # Precondition: none
+    # Postcondition: concurrent callers of a session being loaded wait for that load (single flight); a session cached with
+    #                a lighter profile is reloaded with the requested one and replaces it (upgrade); failed loads are not cached;
+    #                least recently used sessions are evicted beyond max_bytes
+    def get_or_load(self, key: Tuple[int, str, str], loader: Callable[[str], Optional[Session]], profile: str = "full") -> Optional[Session]:
+        rank = PROFILE_ORDER.index(profile)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and PROFILE_ORDER.index(entry[2]) >= rank:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+                pending = self._loading.get(key)
+                if pending is None:
+                    self.misses += 1
+                    if entry is not None:
+                        self.upgrades += 1
+                    future = Future()
+                    self._loading[key] = (future, profile)
+                    break
+
+            # Wait for the load in flight, then look again: it may have loaded a lighter profile
+            pending_future, pending_profile = pending
+            if pending_future.result() is None and PROFILE_ORDER.index(pending_profile) >= rank:
+                return None
+
+        session = None
+        try:
+            session = loader(profile)
+        finally:
+            if session is not None:
+                self.put(key, session, profile)
+            with self._lock:
+                self._loading.pop(key, None)
+            future.set_result(session)
+        return session
+
+    # Store a loaded session
+    # Input: key (from make_key), session (Session), profile (str from LOAD_PROFILES)
+    # Output: none
+    # Precondition: none
+    # Postcondition: least recently used sessions are evicted until the budget is met (the newest one is always kept)
+    def put(self, key: Tuple[int, str, str], session: Session, profile: str = "full") -> None:
+        size = session_memory_usage(session)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (session, size, profile)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    # Cache statistics
+    # Input: none
+    # Output: dict with hits, misses, evictions, size (sessions), bytes and max_bytes
+    # Precondition: none
+    # Postcondition: counters are not reset
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "upgrades": self.upgrades,
+                "size": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    # Empty the cache and reset the counters
+    # Input: none
+    # Output: none
+    # Precondition: none
+    # Postcondition: cache is empty (loads in flight still complete for their callers)
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.hits = self.misses = self.evictions = self.upgrades = 0
+
+
+# Sessions shared by every user of this process
+SESSION_CACHE = SessionCache(int(os.environ.get("F1_SESSION_CACHE_MB", DEFAULT_SESSION_CACHE_MB)) * 1024 * 1024)
+
+
+# Function to load FastF1 session (shared through SESSION_CACHE)
+# Input: year, gp_name, session_type, use_cache (bool), profile (str from LOAD_PROFILES)
+# Output: session or None if loading fails
+# Precondition: none
+# Postcondition: a session already loaded in this process with the same or a richer profile is returned without reloading
+def loading_FastF1_session(year: int, gp_name: str, session_type: str, use_cache: bool = True, profile: str = "full") -> Optional[Session]:
+    if not use_cache:
+        return _load_session(year, gp_name, session_type, profile)
+    key = SessionCache.make_key(year, gp_name, session_type)
+    return SESSION_CACHE.get_or_load(key, lambda loaded_profile: _load_session(year, gp_name, session_type, loaded_profile), profile)
+
+
+# Function to load FastF1 session from the FastF1 disk cache or the API
+# Input: year, gp_name, session_type, profile (str from LOAD_PROFILES), progress (callable taking a stage name, optional)
 # Output: session or None if loading fails
 # Precondition: none
-# Postcondition: session data is loaded or None is returned on error
-def loading_FastF1_session(year: int, gp_name: str, session_type: str) -> Optional[Session]:
+# Postcondition: only the data classes of the profile are loaded, or None is returned on error;
+#                the "laps" profile returns a StoredSession from the lap store (exported on first load);
+#                telemetry is shared with the other processes through the shared store;
+#                progress is called with "schedule", "laps" and "telemetry" as each stage starts
+@dm.timed("session.load")
+def _load_session(year: int, gp_name: str, session_type: str, profile: str = "full", progress: Optional[Callable[[str], None]] = None) -> Optional[Session]:
+    report = progress or (lambda stage: None)
+
+    # Lap-only features are served from the compact lap store once a session has been exported
+    path = ls.store_path(year, gp_name, session_type)
+    if profile == "laps":
+        stored = ls.open_session(path)
+        if stored is not None:
+            return stored
+
+    load_options = dict(LOAD_PROFILES[profile])
+    with_telemetry = load_options.pop("telemetry")
+    telemetry_dir = ss.shared_path(year, gp_name, session_type)
+
     try:
-        print(f"Loading data for {gp_name} {year} - {session_type}...")
+        logger.info("Loading data for %s %s - %s (%s)", gp_name, year, session_type, profile)
+        report("schedule")
         session = fastf1.get_session(year, gp_name, session_type)
-        session.load()
-        return session
+
+        # Laps first, then telemetry as a separate stage (same steps as Session.load)
+        report("laps")
+        with dm.span("session.load.laps"):
+            session.load(telemetry=False, **load_options)
+
+        if with_telemetry and session.f1_api_support:
+            report("telemetry")
+
+            # Telemetry already published by another process is mapped instead of parsed (and held) again
+            if not ss.attach_telemetry(session, telemetry_dir):
+                with dm.span("session.load.telemetry"):
+                    session._load_telemetry()
+
+                # First process to parse the telemetry publishes it, then drops its private copy for the shared mapping
+                try:
+                    if ss.publish_telemetry(session, telemetry_dir):
+                        ss.attach_telemetry(session, telemetry_dir)
+                except Exception as e:
+                    logger.warning("Error publishing session telemetry: %s", e)
     except ValueError as e:
-        print(f"Error: Invalid session parameters - {e}")
+        logger.error("Invalid session parameters - %s", e)
         return None
     except Exception as e:
-        print(f"Error loading session: {e}")
+        logger.error("Error loading session: %s", e)
         return None
 
+    if profile == "laps":
+        try:
+            ls.export_session(session, path)
+            stored = ls.open_session(path)
+            if stored is not None:
+                return stored
+        except Exception as e:
+            logger.warning("Error exporting session to the lap store: %s", e)
+    return session
+
+
+# Background loader of sessions: returns futures, runs at most max_workers parses at once and
+# shares one future between identical requests in flight.
+class SessionLoader:
+
+    # Constructor
+    # Input: cache (SessionCache), max_workers (int)
+    # Output: SessionLoader object
+    # Precondition: max_workers >= 1
+    # Postcondition: loads go through the cache, so a session loaded in the background is a cache hit afterwards
+    def __init__(self, cache: SessionCache, max_workers: int = MAX_CONCURRENT_LOADS):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-loader")
+        self._futures = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    # Request a session in the background
+    # Input: year, gp_name, session_type, profile (str from LOAD_PROFILES)
+    # Output: Future resolving to the Session (or None if loading fails)
+    # Precondition: none
+    # Postcondition: an identical request still in flight returns the same future
+    def submit(self, year: int, gp_name: str, session_type: str, profile: str = "full") -> Future:
+        key = SessionCache.make_key(year, gp_name, session_type)
+        with self._lock:
+            future = self._futures.get((key, profile))
+            if future is not None and not future.done():
+                return future
+
+            self._stages[key] = "queued"
+            loader = lambda loaded_profile: _load_session(year, gp_name, session_type, loaded_profile, lambda stage: self._set_stage(key, stage))
+            future = self._executor.submit(self.cache.get_or_load, key, loader, profile)
+            self._futures[(key, profile)] = future
+
+        future.add_done_callback(lambda done: self._set_stage(key, "failed" if done.exception() or done.result() is None else "done"))
+        return future
+
+    # Record the current stage of a load
+    # Input: key (from SessionCache.make_key), stage (str)
+    # Output: none
+    # Precondition: none
+    # Postcondition: progress(key) returns stage
+    def _set_stage(self, key: Tuple[int, str, str], stage: str) -> None:
+        with self._lock:
+            self._stages[key] = stage
+
+    # Current stage of a requested session, for the UI to poll
+    # Input: year, gp_name, session_type
+    # Output: "queued", "schedule", "laps", "telemetry", "done", "failed", or None if never requested
+    # Precondition: none
+    # Postcondition: none
+    def progress(self, year: int, gp_name: str, session_type: str) -> Optional[str]:
+        with self._lock:
+            return self._stages.get(SessionCache.make_key(year, gp_name, session_type))
+
+
+# Background loads shared by every user of this process
+SESSION_LOADER = SessionLoader(SESSION_CACHE)
+
+
+# Function to load several sessions of an event concurrently
+# Input: year, gp_name, session_types (list of str), profile (str from LOAD_PROFILES)
+# Output: Dict[session_type -> Future]
+# Precondition: none
+# Postcondition: loads overlap (up to MAX_CONCURRENT_LOADS at once) instead of running back to back
+def load_sessions_async(year: int, gp_name: str, session_types: List[str], profile: str = "full") -> Dict[str, Future]:
+    return {session_type: SESSION_LOADER.submit(year, gp_name, session_type, profile) for session_type in session_types}
+
+
 # Function to get the scheduled number of laps for a GP in a given year
 # Input: year (int), gp_name (str)
 # Output: total laps (int) or None if unavailable
 # Precondition: none
-# Postcondition: returns total laps for the specified GP and year, or None if data is unavailable
+# Postcondition: reads the lap count feed of the race only (schedule + one small request), no session data is loaded
 def get_scheduled_race_laps(year: int, gp_name: str) -> Optional[int]:
     try:
-        race_session = loading_FastF1_session(year, gp_name, "R")
-        if race_session is not None:
-            return race_session.event["TotalLaps"]
-        else:
-            return None
+        race_session = fastf1.get_session(year, gp_name, "R")
+        lap_count = fastf1_api.lap_count(race_session.api_path)
+
+        # Last announced value, the feed may correct itself during the race
+        total_laps = [count for count in lap_count["TotalLaps"] if count is not None]
+        return int(total_laps[-1]) if total_laps else None
     except Exception as e:
-        print(f"Error getting scheduled race laps: {e}")
-        return None
\ No newline at end of file
+        logger.error("Error getting scheduled race laps: %s", e)
+        return None
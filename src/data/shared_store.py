@@ -0,0 +1,225 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Telemetry shared by every dashboard process through memory-mapped Arrow files (single writer, many readers).
+#              Only telemetry is shared: laps are still parsed by FastF1 in every process (telemetry and full profiles)
+#              or read into a private compact copy from the lap store (laps profile).
+
+# === Imports ===
+from typing import Dict, Optional
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from fastf1.core import Session, Telemetry
+from src.diagnostics import metrics as dm
+
+# Default directory of the shared sessions, next to the FastF1 cache
+DEFAULT_SHARED_DIR = os.path.join("cache", "shared")
+# Bump when the file layout changes, older files are then ignored and rewritten
+SHARED_VERSION = 1
+# A writer lock older than this is considered abandoned (crashed process)
+STALE_LOCK_SECONDS = 600
+
+# Telemetry kinds stored per session, each one is a dict of driver -> Telemetry on the session
+TELEMETRY_KINDS = {"car_data": "_car_data", "pos_data": "_pos_data"}
+
+
+# Function to build the shared directory of a session
+# Input: year (int), gp_name (str), session_type (str), shared_dir (str)
+# Output: directory path (str)
+# Precondition: none
+# Postcondition: names are normalized like the session cache keys
+def shared_path(year: int, gp_name: str, session_type: str, shared_dir: str = DEFAULT_SHARED_DIR) -> str:
+    name = f"{int(year)}_{gp_name.strip().lower()}_{session_type.strip().upper()}".replace(" ", "_")
+    return os.path.join(shared_dir, name)
+
+
+# Function to convert a telemetry frame to an Arrow table that can be mapped back without copies
+# Input: frame (DataFrame)
+# Output: (pyarrow.Table, list of boolean column names)
+# Precondition: none
+# Postcondition: NaN stays a value (not a null) so float columns remain zero-copy; booleans are stored as uint8 bytes
+#                (Arrow packs booleans into bits); text columns are dictionary-encoded
+def _to_table(frame: pd.DataFrame) -> tuple:
+    arrays, bool_columns = {}, []
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype == bool:
+            arrays[column] = pa.array(values.to_numpy().view(np.uint8))
+            bool_columns.append(column)
+        elif values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[column] = pa.DictionaryArray.from_pandas(pd.Categorical(values))
+        else:
+            arrays[column] = pa.array(values.to_numpy())
+    return pa.table(arrays), bool_columns
+
+
+# Function to convert a mapped Arrow table back to a DataFrame
+# Input: table (pyarrow.Table), bool_columns (list of str)
+# Output: DataFrame
+# Precondition: table was built by _to_table
+# Postcondition: fixed-width columns without nulls are read-only views of the mapping, other columns are copied
+#                (text columns as object dtype, like the frames that were published)
+def _to_frame(table: pa.Table, bool_columns: list) -> pd.DataFrame:
+    columns = {}
+    for name in table.column_names:
+        array = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(array.type):
+            # Back to object strings like fastf1 Telemetry (merge_channels and interpolation assign new values to them)
+            # Rows point to one string object per label (missing values are the extra None label)
+            labels = np.array(array.dictionary.to_pylist() + [None], dtype=object)
+            columns[name] = labels[array.indices.fill_null(-1).to_numpy(zero_copy_only=False)]
+            continue
+        try:
+            values = array.to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            values = array.to_numpy(zero_copy_only=False)
+        columns[name] = values.view(bool) if name in bool_columns else values
+    return pd.DataFrame(columns, copy=False)
+
+
+# Function to read the metadata of a published telemetry file
+# Input: path (str)
+# Output: metadata dict, or None if the file is missing, from another SHARED_VERSION or holds no driver
+# Precondition: none
+# Postcondition: only the schema is read, not the columns
+def _read_metadata(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    metadata = json.loads((schema.metadata or {}).get(b"shared_store", b"{}"))
+    if metadata.get("version") != SHARED_VERSION or not metadata.get("offsets"):
+        return None
+    return metadata
+
+
+# Function to check whether the telemetry of a session has been published
+# Input: directory (str from shared_path)
+# Output: bool
+# Precondition: none
+# Postcondition: true only once every telemetry file has been renamed into place with current, non-empty data
+#                (stale or empty files are then overwritten by the next publish_telemetry)
+def has_telemetry(directory: str) -> bool:
+    return all(_read_metadata(os.path.join(directory, f"{kind}.arrow")) is not None for kind in TELEMETRY_KINDS)
+
+
+# Function to take the single-writer lock of a session directory
+# Input: directory (str)
+# Output: lock file path (str), or None if another process is writing
+# Precondition: directory exists
+# Postcondition: the lock file is created atomically (O_EXCL); an abandoned lock is taken over
+def _acquire_writer_lock(directory: str) -> Optional[str]:
+    lock_path = os.path.join(directory, ".writer.lock")
+    for _ in range(2):
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(descriptor, str(os.getpid()).encode())
+            os.close(descriptor)
+            return lock_path
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) < STALE_LOCK_SECONDS:
+                    return None
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+    return None
+
+
+# Function to publish the telemetry of a loaded session for the other processes
+# Input: session (Session loaded with telemetry), directory (str from shared_path)
+# Output: True if this process wrote the files, False if they exist, another process is writing them or the telemetry is missing
+# Precondition: none
+# Postcondition: one Arrow IPC file per telemetry kind, drivers stored contiguously with their row range in the metadata;
+#                files appear atomically (written to a temporary name, then renamed)
+@dm.timed("shared_store.publish")
+def publish_telemetry(session: Session, directory: str) -> bool:
+    if has_telemetry(directory):
+        return False
+
+    # FastF1 only logs a failed telemetry fetch: never publish empty data that every process would then attach
+    telemetry = {kind: getattr(session, attribute, None) for kind, attribute in TELEMETRY_KINDS.items()}
+    if not all(telemetry.values()):
+        return False
+    os.makedirs(directory, exist_ok=True)
+
+    lock_path = _acquire_writer_lock(directory)
+    if lock_path is None:
+        return False
+
+    try:
+        for kind, frames in telemetry.items():
+            offsets, parts, start = {}, [], 0
+            for driver, frame in frames.items():
+                offsets[driver] = [start, len(frame)]
+                parts.append(pd.DataFrame(frame))
+                start += len(frame)
+
+            table, bool_columns = _to_table(pd.concat(parts, ignore_index=True) if parts else pd.DataFrame())
+            metadata = {"version": SHARED_VERSION, "t0_date": str(session.t0_date), "offsets": offsets, "bool_columns": bool_columns}
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"shared_store": json.dumps(metadata).encode()})
+
+            # Uncompressed so that readers can map the columns without decoding them
+            path = os.path.join(directory, f"{kind}.arrow")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+    finally:
+        os.remove(lock_path)
+    return True
+
+
+# Function to read one telemetry file as memory-mapped frames per driver
+# Input: path (str)
+# Output: (metadata dict, Dict[driver -> DataFrame]) or None if the file belongs to another SHARED_VERSION or holds no driver
+# Precondition: path was written by publish_telemetry
+# Postcondition: numeric columns of the frames point into the mapped file (no copy, pages shared by every process)
+def _map_telemetry(path: str) -> Optional[tuple]:
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+
+    metadata = json.loads((table.schema.metadata or {}).get(b"shared_store", b"{}"))
+    if metadata.get("version") != SHARED_VERSION or not metadata.get("offsets"):
+        return None
+
+    frames = {}
+    for driver, (start, length) in metadata["offsets"].items():
+        frames[driver] = _to_frame(table.slice(start, length), metadata["bool_columns"])
+    return metadata, frames
+
+
+# Function to attach published telemetry to a session loaded without telemetry
+# Input: session (Session loaded with laps=True, telemetry=False), directory (str from shared_path)
+# Output: True if the telemetry was attached, False if it is not published (or from another SHARED_VERSION, or empty)
+# Precondition: none
+# Postcondition: session.car_data, session.pos_data and session.t0_date behave as after a telemetry load,
+#                backed by the shared read-only mapping; laps get their LapStartDate column
+@dm.timed("shared_store.attach")
+def attach_telemetry(session: Session, directory: str) -> bool:
+    if not has_telemetry(directory):
+        return False
+
+    mapped = {}
+    for kind in TELEMETRY_KINDS:
+        result = _map_telemetry(os.path.join(directory, f"{kind}.arrow"))
+        if result is None:
+            return False
+        mapped[kind] = result
+
+    t0_date = mapped["car_data"][0]["t0_date"]
+    session._t0_date = pd.Timestamp(t0_date) if t0_date != "None" else None
+
+    for kind, attribute in TELEMETRY_KINDS.items():
+        telemetry: Dict[str, Telemetry] = {
+            driver: Telemetry(frame, session=session, driver=driver)
+            for driver, frame in mapped[kind][1].items()
+        }
+        setattr(session, attribute, telemetry)
+
+    if hasattr(session, '_laps') and session._t0_date is not None:
+        session._laps['LapStartDate'] = session._laps['LapStartTime'] + session._t0_date
+    return True
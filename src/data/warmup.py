@@ -0,0 +1,200 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Command-line warm-up of the FastF1 cache (python -m src.data.warmup --season 2024 --events Monza --sessions FP1 FP2)
+
+# === Imports ===
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import glob
+import os
+import sys
+import time
+import fastf1
+import pandas as pd
+from fastf1.events import EventSchedule
+from fastf1.livetiming.data import LiveTimingData
+from src.data import session_data as sd
+
+# Default number of sessions parsed at the same time
+DEFAULT_WORKERS = 4
+# Sub-directory of the cache directory receiving the sessions parsed from recordings (kept apart from the API data)
+REPLAY_CACHE_SUBDIR = "replay"
+
+
+# Function to build the path of the recorded event schedule of a season
+# Input: source_dir (str), season (int)
+# Output: file path (str)
+# Precondition: none
+# Postcondition: none
+def schedule_path(source_dir: str, season: int) -> str:
+    return os.path.join(source_dir, f"{season}_schedule.csv")
+
+
+# Function to record the event schedule of a season next to the live timing recordings
+# Input: season (int), source_dir (str)
+# Output: file path (str)
+# Precondition: the FastF1 schedule can be fetched (network or cache)
+# Postcondition: the schedule is written as CSV, readable offline by load_schedule
+def save_schedule(season: int, source_dir: str) -> str:
+    os.makedirs(source_dir, exist_ok=True)
+    path = schedule_path(source_dir, season)
+    fastf1.get_event_schedule(season, include_testing=False).to_csv(path, index=False)
+    return path
+
+
+# Function to read a recorded event schedule
+# Input: source_dir (str), season (int)
+# Output: EventSchedule
+# Precondition: the file was written by save_schedule
+# Postcondition: dtypes match a schedule fetched by FastF1 (local session dates keep their UTC offset), no network access
+def load_schedule(source_dir: str, season: int) -> EventSchedule:
+    path = schedule_path(source_dir, season)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No recorded schedule for {season} in {source_dir} (create it with --save-schedule)")
+
+    frame = pd.read_csv(path)
+    for column, dtype in EventSchedule._COLUMNS.items():
+        if column not in frame.columns:
+            continue
+        if dtype == "datetime64[ns]":
+            frame[column] = pd.to_datetime(frame[column])
+        elif column.endswith("Date"):
+            frame[column] = frame[column].map(lambda value: pd.Timestamp(value) if isinstance(value, str) else pd.NaT)
+        elif dtype is str:
+            frame[column] = frame[column].fillna("").astype(str)
+    return EventSchedule(frame, year=season)
+
+
+# Function to find the recorded live timing files of a session
+# Input: source_dir (str), season (int), event (str), session_type (str)
+# Output: sorted list of file paths (empty if none)
+# Precondition: recordings are named "<season>_<event>_<session>*.txt" (case-insensitive, spaces as underscores)
+# Postcondition: none
+def recorded_files(source_dir: str, season: int, event: str, session_type: str) -> List[str]:
+    prefix = f"{season}_{event}_{session_type}".replace(" ", "_").lower()
+    return sorted(
+        path for path in glob.glob(os.path.join(source_dir, "*.txt"))
+        if os.path.basename(path).lower().startswith(prefix)
+    )
+
+
+# Function to load and parse one session into the FastF1 cache (runs in a worker process)
+# Input: season (int), event (str), session_type (str), profile (str from LOAD_PROFILES), cache_dir (str), source_dir (str, optional)
+# Output: dict with event, session, profile, seconds, ok and error
+# Precondition: cache_dir is writable
+# Postcondition: the parsed session is in the FastF1 cache; errors are reported, never raised;
+#                with a source directory, the schedule and the live timing data come from the recordings, requests are
+#                not sent (offline mode) and the parsed session goes to the replay cache (see replay_cache_dir)
+def warm_session(season: int, event: str, session_type: str, profile: str, cache_dir: str, source_dir: Optional[str] = None) -> Dict:
+    start = time.perf_counter()
+    result = {"event": event, "session": session_type, "profile": profile, "ok": False, "error": None}
+
+    try:
+        if source_dir is None:
+            sd.setup_fastf1_cache(cache_dir)
+            session = fastf1.get_session(season, event, session_type)
+            livedata = None
+        else:
+            sd.setup_fastf1_cache(replay_cache_dir(cache_dir))
+            fastf1.Cache.offline_mode(True)
+
+            # FastF1 live timing recordings (fastf1.livetiming) replace the live timing API
+            files = recorded_files(source_dir, season, event, session_type)
+            if not files:
+                raise FileNotFoundError(f"No recording for {season} {event} {session_type} in {source_dir}")
+            livedata = LiveTimingData(*files)
+            session = load_schedule(source_dir, season).get_event_by_name(event).get_session(session_type)
+
+        session.load(**sd.LOAD_PROFILES[profile], livedata=livedata)
+
+        if session.laps.empty:
+            raise ValueError("Session loaded without any lap")
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# Function to build the cache directory of the sessions parsed from recordings
+# Input: cache_dir (str)
+# Output: directory path (str)
+# Precondition: none
+# Postcondition: replayed data never mixes with the data fetched from the API
+def replay_cache_dir(cache_dir: str) -> str:
+    return os.path.join(cache_dir, REPLAY_CACHE_SUBDIR)
+
+
+# Function to warm up several sessions with a bounded process pool
+# Input: season (int), events (list of str), session_types (list of str), profile (str), cache_dir (str), source_dir (str, optional), workers (int)
+# Output: list of result dicts from warm_session, in completion order
+# Precondition: workers >= 1
+# Postcondition: every (event, session_type) pair was attempted once
+def warm_up(season: int, events: List[str], session_types: List[str], profile: str = "full", cache_dir: str = "cache", source_dir: Optional[str] = None, workers: int = DEFAULT_WORKERS) -> List[Dict]:
+
+    # Create the cache directory once, before workers race to create it
+    sd.setup_fastf1_cache(cache_dir if source_dir is None else replay_cache_dir(cache_dir))
+
+    jobs = [(event, session_type) for event in events for session_type in session_types]
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)) or 1) as pool:
+        futures = [pool.submit(warm_session, season, event, session_type, profile, cache_dir, source_dir) for event, session_type in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            status = "ok" if result["ok"] else f"FAILED ({result['error']})"
+            print(f"{season} {result['event']} {result['session']}: {result['seconds']:.1f}s {status}", flush=True)
+            results.append(result)
+    return results
+
+
+# Function to parse the command-line arguments
+# Input: argv (list of str, optional)
+# Output: argparse.Namespace
+# Precondition: none
+# Postcondition: none
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-load and pre-parse FastF1 sessions into the local cache.")
+    parser.add_argument("--season", type=int, required=True, help="Season year (e.g. 2024)")
+    parser.add_argument("--events", nargs="+", default=[], help="Grand Prix names (e.g. Monza Silverstone)")
+    parser.add_argument("--sessions", nargs="+", default=["FP1", "FP2", "FP3", "Q", "R"], help="Session types (default: all)")
+    parser.add_argument("--profile", choices=sd.PROFILE_ORDER, default="full", help="Data loaded per session (default: full)")
+    parser.add_argument("--cache-dir", default="cache", help="FastF1 cache directory (default: cache)")
+    parser.add_argument("--source-dir", default=None, help="Directory of FastF1 live timing recordings and <season>_schedule.csv used instead of the API "
+                                                           "(parsed sessions go to <cache-dir>/replay)")
+    parser.add_argument("--save-schedule", action="store_true", help="Write the season schedule to --source-dir and exit")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Parallel worker processes (default: {DEFAULT_WORKERS})")
+    return parser.parse_args(argv)
+
+
+# Entry point
+# Input: argv (list of str, optional)
+# Output: exit code (0 if every session was warmed up, 1 otherwise)
+# Precondition: none
+# Postcondition: a summary with the total time and the failures is printed
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    if args.save_schedule:
+        if args.source_dir is None:
+            print("--save-schedule needs --source-dir")
+            return 1
+        print(f"Schedule written to {save_schedule(args.season, args.source_dir)}")
+        return 0
+    if not args.events:
+        print("--events is required")
+        return 1
+
+    start = time.perf_counter()
+    results = warm_up(args.season, args.events, args.sessions, args.profile, args.cache_dir, args.source_dir, args.workers)
+    failures = [r for r in results if not r["ok"]]
+
+    print(f"\nWarmed up {len(results) - len(failures)}/{len(results)} sessions in {time.perf_counter() - start:.1f}s")
+    for failure in failures:
+        print(f"  failed: {args.season} {failure['event']} {failure['session']} - {failure['error']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Lightweight span/timer instrumentation (wall time, call counts, optional tracemalloc peaks, JSON lines)
+
+# === Imports ===
+from typing import Callable, Dict, List, Optional
+from collections import deque
+from contextlib import contextmanager
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+# Number of recent durations kept per operation for the percentiles
+HISTORY_SIZE = 1024
+
+
+# Process-wide instrumentation settings and aggregates.
+class _MetricsState:
+
+    # Constructor
+    # Input: none
+    # Output: _MetricsState object
+    # Precondition: none
+    # Postcondition: enabled by F1_METRICS=1, memory tracing by F1_METRICS_MEMORY=1, JSON lines written to F1_METRICS_FILE
+    def __init__(self):
+        self.enabled = os.environ.get("F1_METRICS", "0") == "1"
+        self.trace_memory = os.environ.get("F1_METRICS_MEMORY", "0") == "1"
+        self.output_path = os.environ.get("F1_METRICS_FILE")
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.operations = {}
+
+
+_state = _MetricsState()
+
+
+# Function to change the instrumentation settings at runtime
+# Input: enabled (bool, optional), trace_memory (bool, optional), output_path (str, optional; "" disables the file)
+# Output: none
+# Precondition: none
+# Postcondition: settings passed as None are left unchanged; tracemalloc is started when memory tracing is turned on
+def configure(enabled: Optional[bool] = None, trace_memory: Optional[bool] = None, output_path: Optional[str] = None) -> None:
+    if enabled is not None:
+        _state.enabled = enabled
+    if trace_memory is not None:
+        _state.trace_memory = trace_memory
+    if output_path is not None:
+        _state.output_path = output_path or None
+    if _state.enabled and _state.trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# Function to check whether instrumentation is on
+# Input: none
+# Output: bool
+# Precondition: none
+# Postcondition: none
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+# Function to check whether memory peaks are recorded
+# Input: none
+# Output: bool
+# Precondition: none
+# Postcondition: none
+def is_tracing_memory() -> bool:
+    return _state.enabled and _state.trace_memory and tracemalloc.is_tracing()
+
+
+# Function to record one finished span
+# Input: name (str), seconds (float), peak_bytes (int, optional)
+# Output: none
+# Precondition: none
+# Postcondition: aggregates are updated and, if an output file is set, one JSON line is appended
+def _record(name: str, seconds: float, peak_bytes: Optional[int]) -> None:
+    with _state.lock:
+        operation = _state.operations.get(name)
+        if operation is None:
+            operation = {"count": 0, "total": 0.0, "max": 0.0, "peak_bytes": None, "history": deque(maxlen=HISTORY_SIZE)}
+            _state.operations[name] = operation
+        operation["count"] += 1
+        operation["total"] += seconds
+        operation["max"] = max(operation["max"], seconds)
+        operation["history"].append(seconds)
+        if peak_bytes is not None:
+            operation["peak_bytes"] = max(operation["peak_bytes"] or 0, peak_bytes)
+
+        if _state.output_path:
+            line = {"ts": time.time(), "name": name, "wall_ms": seconds * 1000.0, "thread": threading.current_thread().name}
+            if peak_bytes is not None:
+                line["peak_kb"] = peak_bytes / 1024.0
+            with open(_state.output_path, "a", encoding="utf-8") as output:
+                output.write(json.dumps(line) + "\n")
+
+
+# Context manager timing a block of code
+# Input: name (str, e.g. "predictor.fit")
+# Output: context manager
+# Precondition: none
+# Postcondition: when disabled, only a flag check is added; when enabled, wall time (and the tracemalloc peak above the
+#                memory in use at entry, if memory tracing is on) is recorded under name; nested spans are recorded separately
+@contextmanager
+def span(name: str):
+    if not _state.enabled:
+        yield
+        return
+
+    trace = _state.trace_memory and tracemalloc.is_tracing()
+    depth = getattr(_state.local, "depth", 0)
+    if trace:
+        # Only the outermost span resets the peak, so nested spans report the peak since that point
+        if depth == 0:
+            tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+
+    _state.local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _state.local.depth = depth
+        peak_bytes = max(tracemalloc.get_traced_memory()[1] - start_memory, 0) if trace else None
+        _record(name, seconds, peak_bytes)
+
+
+# Decorator timing every call of a function
+# Input: name (str, optional, defaults to module.qualname)
+# Output: decorator
+# Precondition: none
+# Postcondition: when disabled, the wrapper calls the function directly after a flag check
+def timed(name: Optional[str] = None) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Function to summarize the recorded operations
+# Input: none
+# Output: list of dicts (name, count, total_ms, mean_ms, p50_ms, p95_ms, max_ms, peak_kb), slowest total first
+# Precondition: none
+# Postcondition: percentiles cover the last HISTORY_SIZE calls of each operation
+def summary() -> List[Dict]:
+    with _state.lock:
+        rows = []
+        for name, operation in _state.operations.items():
+            history = np.fromiter(operation["history"], dtype=float) * 1000.0
+            rows.append({
+                "name": name,
+                "count": operation["count"],
+                "total_ms": operation["total"] * 1000.0,
+                "mean_ms": operation["total"] * 1000.0 / operation["count"],
+                "p50_ms": float(np.percentile(history, 50)),
+                "p95_ms": float(np.percentile(history, 95)),
+                "max_ms": operation["max"] * 1000.0,
+                "peak_kb": operation["peak_bytes"] / 1024.0 if operation["peak_bytes"] is not None else None,
+            })
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+# Function to forget every recorded operation
+# Input: none
+# Output: none
+# Precondition: none
+# Postcondition: summary() is empty, settings are unchanged
+def reset() -> None:
+    with _state.lock:
+        _state.operations.clear()
@@ -0,0 +1,112 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Bounded LRU cache for strategy evaluations, shared across Streamlit reruns
+
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+from .race_engine import RaceEngine
+
+# Default number of cached strategy evaluations
+DEFAULT_MAX_ENTRIES = 4096
+
+
+# Compute a stable fingerprint of the engine inputs that change simulation results
+# Input: engine (RaceEngine)
+# Output: hex digest (str)
+# Precondition: engine parameters contain base_pace (timedelta), degradation and variance per compound
+# Postcondition: identical parameters, race_laps, fuel_coef, pit_delta and neutralization model give the same digest in any process
+def engine_fingerprint(engine: RaceEngine) -> str:
+    payload = {
+        "parameters": {
+            compound: [params["base_pace"].total_seconds(), params["degradation"], params["variance"]]
+            for compound, params in engine.parameters.items()
+        },
+        "race_laps": engine.race_laps,
+        "fuel_coef": engine.fuel_coef,
+        "pit_delta": engine.pit_delta,
+        "neutralization": engine.neutralization,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# Thread-safe LRU cache of strategy evaluation results.
+class StrategyCache:
+
+    # Constructor
+    # Input: max_entries (int)
+    # Output: StrategyCache object
+    # Precondition: max_entries > 0
+    # Postcondition: empty cache with zeroed counters
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Build the cache key of one evaluation
+    # Input: fingerprint (str from engine_fingerprint), compounds (list of str), pit_laps (list of int), monte_carlo (bool),
+    #        n_simulations (int), seed (int, optional), common_random_numbers (bool)
+    # Output: hashable key
+    # Precondition: none
+    # Postcondition: returns None when the evaluation is not reproducible (Monte Carlo without seed)
+    def make_key(self, fingerprint: str, compounds: List[str], pit_laps: List[int], monte_carlo: bool, n_simulations: int, seed: Optional[int], common_random_numbers: bool = False) -> Optional[Tuple]:
+        if not monte_carlo:
+            return (fingerprint, tuple(compounds), tuple(pit_laps), False)
+        if seed is None:
+            return None
+        return (fingerprint, tuple(compounds), tuple(pit_laps), True, n_simulations, seed, common_random_numbers)
+
+    # Look up an evaluation
+    # Input: key (from make_key)
+    # Output: copy of the cached result or None
+    # Precondition: none
+    # Postcondition: hit/miss counters are updated, a hit becomes the most recently used entry
+    def get(self, key: Tuple) -> Optional[Dict]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(self._entries[key])
+
+    # Store an evaluation
+    # Input: key (from make_key), result (dict)
+    # Output: none
+    # Precondition: none
+    # Postcondition: least recently used entries are evicted beyond max_entries
+    def put(self, key: Tuple, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Cache statistics
+    # Input: none
+    # Output: dict with hits, misses, evictions and size
+    # Precondition: none
+    # Postcondition: counters are not reset
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
+
+    # Empty the cache and reset the counters
+    # Input: none
+    # Output: none
+    # Precondition: none
+    # Postcondition: cache is empty
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# Process-wide cache, survives Streamlit reruns and is shared between users of the same server
+STRATEGY_CACHE = StrategyCache()
@@ -0,0 +1,174 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Full-grid race simulator with array-backed car state (traffic, dirty air, overtaking)
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .race_engine import RaceEngine
+
+# Gap to the car ahead (seconds) under which a car suffers from dirty air
+DIRTY_AIR_GAP = 1.0
+# Lap time lost in dirty air (seconds)
+DIRTY_AIR_PENALTY = 0.3
+# Pace advantage over the car ahead (seconds) needed to complete an overtake
+OVERTAKE_THRESHOLD = 0.5
+# Gap kept behind a car that cannot be passed (seconds)
+MIN_FOLLOW_GAP = 0.2
+# Gap between consecutive grid slots at the start (seconds)
+START_GAP = 0.3
+
+
+# Simulate every car of the field at once.
+# Race state (race time, position, laps in dirty air) lives in NumPy arrays of shape (runs, cars); tyre state (compound,
+# tyre age, stint index) in arrays of shape (cars,), the strategies being the same in every run.
+class FieldSimulator:
+
+    # Constructor
+    # Input: parameters (dict driver -> Predictor parameters), grid (list of drivers in starting order), race_laps (int),
+    #        fuel_coef (float), pit_delta (float)
+    # Output: FieldSimulator object
+    # Precondition: every driver of the grid has parameters
+    # Postcondition: Simulator ready to race strategies, tyre parameters are tabulated per (car, compound)
+    def __init__(self, parameters: Dict[str, Dict[str, Dict[str, float]]], grid: List[str], race_laps: int, fuel_coef: float = 0.035, pit_delta: float = 22.0):
+        missing = [driver for driver in grid if driver not in parameters]
+        if missing:
+            raise ValueError(f"No parameters for drivers: {missing}")
+
+        self.grid = list(grid)
+        self.race_laps = race_laps
+        self.fuel_coef = fuel_coef
+        self.pit_delta = pit_delta
+
+        # One engine per driver, only used to split strategies into stints before the race loop
+        self.engines = {driver: RaceEngine(parameters[driver], race_laps, fuel_coef=fuel_coef, pit_delta=pit_delta) for driver in grid}
+
+        # Tyre model tables indexed by (car, compound code), NaN for compounds a driver has no parameters for
+        self.compounds = sorted({compound for driver in grid for compound in parameters[driver]})
+        shape = (len(self.grid), len(self.compounds))
+        self.base, self.degradation, self.variance = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+        for car, driver in enumerate(self.grid):
+            for compound, params in parameters[driver].items():
+                code = self.compounds.index(compound)
+                self.base[car, code] = params["base_pace"].total_seconds()
+                self.degradation[car, code] = params["degradation"]
+                self.variance[car, code] = params["variance"]
+
+    # Build the per-car stint plans of a set of strategies
+    # Input: strategies (dict driver -> (compounds, pit_laps))
+    # Output: (compound_plan (cars, stints) compound codes per stint, pit_flags (cars, race_laps) True on every pit lap)
+    # Precondition: every driver of the grid has a valid strategy
+    # Postcondition: arrays follow the grid order; pit laps outside the race are ignored, duplicates only count once
+    def build_plans(self, strategies: Dict[str, Tuple[List[str], List[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+
+        n_cars = len(self.grid)
+        max_stints = max(len(strategies[driver][0]) for driver in self.grid)
+        compound_plan = np.zeros((n_cars, max_stints), dtype=int)
+        pit_flags = np.zeros((n_cars, self.race_laps), dtype=bool)
+
+        for car, driver in enumerate(self.grid):
+            compounds, pit_laps = strategies[driver]
+            compound_plan[car, :len(compounds)] = [self.compounds.index(compound) for compound in compounds]
+
+            # New tyres (and the pit loss) on the pit lap itself
+            for first_lap, _ in self.engines[driver].stint_bounds(pit_laps)[1:]:
+                pit_flags[car, first_lap - 1] = True
+
+        return compound_plan, pit_flags
+
+    # Race the whole field
+    # Input: strategies (dict driver -> (compounds, pit_laps)), n_simulations (int), seed (int, optional), rng (np.random.Generator, optional)
+    # Output: dict with race_time, position and traffic_laps (runs x cars), mean_position and mean_race_time (cars), drivers (grid order)
+    # Precondition: every driver of the grid has a valid strategy
+    # Postcondition: results only depend on the strategies and the rng state; lap times follow the RaceEngine model
+    #                (degradation over the tyre age of the current compound, fuel effect) plus traffic
+    def simulate(self, strategies: Dict[str, Tuple[List[str], List[int]]], n_simulations: int = 100, seed: Optional[int] = None, rng: Optional[np.random.Generator] = None) -> Dict:
+
+        if rng is None:
+            rng = np.random.default_rng(seed)
+
+        compound_plan, pit_flags = self.build_plans(strategies)
+        n_cars = len(self.grid)
+        cars = np.arange(n_cars)
+        runs = np.arange(n_simulations)[:, None]
+
+        # Tyre state per car: stint index, compound code and laps on the current set
+        stint = np.zeros(n_cars, dtype=int)
+        compound = compound_plan[:, 0]
+        tyre_age = np.zeros(n_cars, dtype=int)
+
+        # Race state per run and car: cumulative race time, position and laps spent in dirty air
+        race_time = np.tile(np.arange(n_cars) * START_GAP, (n_simulations, 1))
+        position = np.tile(cars + 1, (n_simulations, 1))
+        traffic_laps = np.zeros((n_simulations, n_cars), dtype=int)
+
+        for lap in range(self.race_laps):
+
+            # Pit stops: next stint, new set of the next compound
+            pitting = pit_flags[:, lap]
+            stint = stint + pitting
+            compound = compound_plan[cars, stint]
+            tyre_age = np.where(pitting, 1, tyre_age + 1)
+
+            # Free-air lap time of every car from its tyre state (same model as RaceEngine.compute_lap_times)
+            tyre_time = self.base[cars, compound] + self.degradation[cars, compound] * (np.exp(0.08 * tyre_age) - 1)
+            fuel_time = -self.fuel_coef * (self.race_laps - (lap + 1))
+            lap_time = tyre_time + fuel_time + self.pit_delta * pitting
+
+            # Running order at the start of the lap
+            order = np.argsort(race_time, axis=1, kind="stable")
+            ordered_time = np.take_along_axis(race_time, order, axis=1)
+
+            pace = lap_time + rng.standard_normal((n_simulations, n_cars)) * self.variance[cars, compound]
+            ordered_pace = np.take_along_axis(pace, order, axis=1)
+
+            # Dirty air behind a close car ahead
+            gap_ahead = np.diff(ordered_time, axis=1)
+            in_traffic = np.concatenate((np.zeros((n_simulations, 1), dtype=bool), gap_ahead < DIRTY_AIR_GAP), axis=1)
+            ordered_pace = ordered_pace + DIRTY_AIR_PENALTY * in_traffic
+
+            # Cars without enough pace advantage stay behind the car ahead (resolved front to back)
+            finish = ordered_time + ordered_pace
+            for rank in range(1, n_cars):
+                ahead = finish[:, rank - 1]
+                blocked = ordered_pace[:, rank - 1] - ordered_pace[:, rank] < OVERTAKE_THRESHOLD
+                finish[:, rank] = np.where(blocked, np.maximum(finish[:, rank], ahead + MIN_FOLLOW_GAP), finish[:, rank])
+
+            # Back to grid order
+            race_time[runs, order] = finish
+            traffic_laps[runs, order] += in_traffic
+            position[runs, np.argsort(race_time, axis=1, kind="stable")] = cars + 1
+
+        return {
+            "drivers": self.grid,
+            "race_time": race_time,
+            "position": position,
+            "traffic_laps": traffic_laps,
+            "mean_position": position.mean(axis=0),
+            "mean_race_time": race_time.mean(axis=0)
+        }
+
+    # Rank pit laps of one driver against the rest of the field
+    # Input: driver (str), compounds (list of str), pit_laps_options (list of pit-lap lists), strategies (dict for the other drivers),
+    #        n_simulations (int), seed (int, optional)
+    # Output: list of dicts with pit_laps, mean_position, mean_race_time and mean traffic_laps, sorted by mean_position then time
+    # Precondition: strategies covers every other driver of the grid
+    # Postcondition: every option is raced on the same random numbers (common seed)
+    def evaluate_pit_laps(self, driver: str, compounds: List[str], pit_laps_options: List[List[int]], strategies: Dict[str, Tuple[List[str], List[int]]], n_simulations: int = 100, seed: Optional[int] = None) -> List[Dict]:
+
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+
+        car = self.grid.index(driver)
+        results = []
+        for pit_laps in pit_laps_options:
+            field = dict(strategies)
+            field[driver] = (compounds, pit_laps)
+            outcome = self.simulate(field, n_simulations=n_simulations, seed=seed)
+            results.append({
+                "pit_laps": pit_laps,
+                "mean_position": float(outcome["mean_position"][car]),
+                "mean_race_time": float(outcome["mean_race_time"][car]),
+                "traffic_laps": float(outcome["traffic_laps"][:, car].mean())
+            })
+
+        return sorted(results, key=lambda x: (x["mean_position"], x["mean_race_time"]))
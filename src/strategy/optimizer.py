@@ -2,9 +2,15 @@
 # Date: 25/02/2026
 # Description: Strategy optimizer for race simulation engine
 
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from .race_engine import RaceEngine
+from .cache import StrategyCache, engine_fingerprint
 from itertools import permutations
+import heapq
+import numpy as np
+import zlib
+from src.diagnostics import metrics as dm
 
 # Maximum realistic stint lengths per compound (laps)
 MAX_STINT_LENGTH = {
@@ -15,38 +21,192 @@ MAX_STINT_LENGTH = {
     "WET": 25 
 }
 
+# Number of chunks handed to each worker, balances load against per-task overhead
+CHUNKS_PER_WORKER = 4
+
+# Largest multi-stop candidate pool iter_top_k widens to (the dynamic program cost grows linearly with it)
+MAX_CANDIDATE_POOL = 800
+
+
+# Derive the random seed of one candidate strategy from a master seed
+# Input: master_seed (int), compounds (list of str), pit_laps (list of int)
+# Output: np.random.SeedSequence
+# Precondition: none
+# Postcondition: the seed only depends on the master seed and the strategy itself,
+#                not on the evaluation order or on the number of workers
+def candidate_seed(master_seed: int, compounds: List[str], pit_laps: List[int]) -> np.random.SeedSequence:
+    spawn_key = tuple(zlib.crc32(c.encode()) for c in compounds) + tuple(int(lap) for lap in pit_laps)
+    return np.random.SeedSequence(master_seed, spawn_key=spawn_key)
+
+
+# Evaluate a chunk of candidate strategies (runs inside a worker)
+# Input: engine (RaceEngine), candidates (list of (compounds, pit_laps)), monte_carlo (bool), n_simulations (int), master_seed (int),
+#        common_random_numbers (bool)
+# Output: list of results with compounds, pit_laps, total_time, std_time, in candidate order
+#         (plus the simulated totals under "samples" with common random numbers)
+# Precondition: every candidate is a valid strategy
+# Postcondition: engine state is unchanged
+def evaluate_chunk(engine: RaceEngine, candidates: List[Tuple[List[str], List[int]]], monte_carlo: bool, n_simulations: int, master_seed: int, common_random_numbers: bool = False) -> List[Dict]:
+
+    # Same noise realizations for every candidate, regenerated from the master seed in each worker
+    noise = None
+    if monte_carlo and common_random_numbers:
+        noise = engine.draw_common_noise(n_simulations, np.random.default_rng(master_seed))
+
+    results = []
+    for compounds, pit_laps in candidates:
+        samples = None
+        if monte_carlo:
+            # Run Monte Carlo to get mean total time
+            rng = np.random.default_rng(candidate_seed(master_seed, compounds, pit_laps)) if noise is None else None
+            samples = engine.sample_race_times(compounds, pit_laps, n_simulations, rng=rng, noise=noise)
+            total_time = float(np.mean(samples))
+            std_time = float(np.std(samples))
+        else:
+            total_time = engine.strategy_time(compounds, pit_laps)
+            std_time = 0.0
+
+        result = {
+            "compounds": compounds,
+            "pit_laps": pit_laps,
+            "total_time": total_time,
+            "std_time": std_time
+        }
+        if noise is not None:
+            result["samples"] = samples
+        results.append(result)
+
+    return results
+
+
+# Replace simulated samples by paired deltas to the best strategy
+# Input: results (list of results with "samples")
+# Output: none
+# Precondition: every result was simulated on the same noise realizations
+# Postcondition: each result has delta_to_best and delta_std_error, "samples" is removed
+def add_paired_deltas(results: List[Dict]) -> None:
+
+    if not results:
+        return
+
+    best = min(results, key=lambda x: x["total_time"])["samples"]
+    for result in results:
+        difference = result.pop("samples") - best
+        result["delta_to_best"] = float(difference.mean())
+        result["delta_std_error"] = float(difference.std(ddof=1) / np.sqrt(len(difference))) if len(difference) > 1 else 0.0
+
+
 # Optimizer for race strategies.
 class StrategyOptimizer:
 
     # Constructor
-    # Input: engine (RaceEngine object)
+    # Input: engine (RaceEngine object), n_workers (int), executor (str, "process" or "thread"), cache (StrategyCache, optional)
     # Output: StrategyOptimizer object
-    # Precondition: engine is initialized
-    # Postcondition: Optimizer ready to search strategies
-    def __init__(self, engine: RaceEngine):
+    # Precondition: engine is initialized, n_workers >= 1
+    # Postcondition: Optimizer ready to search strategies, candidates are spread over n_workers when n_workers > 1
+    #                and evaluations are reused from the cache when one is given
+    def __init__(self, engine: RaceEngine, n_workers: int = 1, executor: str = "process", cache: Optional[StrategyCache] = None):
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown executor: {executor}")
         self.engine = engine
+        self.n_workers = n_workers
+        self.executor = executor
+        self.cache = cache
+        # Counters of the last iter_top_k search
+        self.last_search_stats = {"candidates": 0, "evaluated": 0, "pool_expansions": 0, "truncated": False}
+
+    # Evaluate candidate strategies, serially or on a worker pool
+    # Input: candidates (list of (compounds, pit_laps)), monte_carlo (bool), n_simulations (int), master_seed (int),
+    #        common_random_numbers (bool)
+    # Output: list of raw results in candidate order (with "samples" under common random numbers)
+    # Precondition: every candidate is a valid strategy
+    # Postcondition: results are identical for any n_workers given the same master seed
+    def _run_candidates(self, candidates: List[Tuple[List[str], List[int]]], monte_carlo: bool, n_simulations: int, master_seed: int, common_random_numbers: bool) -> List[Dict]:
+
+        if self.n_workers <= 1 or len(candidates) <= 1:
+            return evaluate_chunk(self.engine, candidates, monte_carlo, n_simulations, master_seed, common_random_numbers)
+
+        n_chunks = min(len(candidates), self.n_workers * CHUNKS_PER_WORKER)
+        chunks = [candidates[i::n_chunks] for i in range(n_chunks)]
+
+        pool_class = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=self.n_workers) as pool:
+            chunk_results = list(pool.map(
+                evaluate_chunk,
+                [self.engine] * n_chunks,
+                chunks,
+                [monte_carlo] * n_chunks,
+                [n_simulations] * n_chunks,
+                [master_seed] * n_chunks,
+                [common_random_numbers] * n_chunks
+            ))
+
+        # Restore candidate order (chunks were dealt round-robin)
+        results = [None] * len(candidates)
+        for i, chunk in enumerate(chunk_results):
+            results[i::n_chunks] = chunk
+        return results
+
+    # Evaluate candidate strategies, reusing cached evaluations
+    # Input: candidates (list of (compounds, pit_laps)), monte_carlo (bool), n_simulations (int), seed (int, optional),
+    #        common_random_numbers (bool), master_seed (int, optional)
+    # Output: list of results in candidate order (with paired deltas to the best under common random numbers)
+    # Precondition: every candidate is a valid strategy
+    # Postcondition: results are identical for any n_workers given the same seed, only cache misses are simulated;
+    #                master_seed only drives the noise of an unseeded call (several batches sharing one draw), seed alone keys the cache
+    @dm.timed("optimizer.evaluate_candidates")
+    def evaluate_candidates(self, candidates: List[Tuple[List[str], List[int]]], monte_carlo: bool = True, n_simulations: int = 100, seed: Optional[int] = None, common_random_numbers: bool = False, master_seed: Optional[int] = None) -> List[Dict]:
+
+        # Fresh master seed when none is given, still shared by every worker
+        if seed is not None:
+            master_seed = seed
+        elif master_seed is None:
+            master_seed = np.random.SeedSequence().entropy
+
+        results = [None] * len(candidates)
+        keys = [None] * len(candidates)
+
+        if self.cache is not None:
+            fingerprint = engine_fingerprint(self.engine)
+            for i, (compounds, pit_laps) in enumerate(candidates):
+                keys[i] = self.cache.make_key(fingerprint, compounds, pit_laps, monte_carlo, n_simulations, seed, common_random_numbers)
+                if keys[i] is not None:
+                    results[i] = self.cache.get(keys[i])
+
+        # Simulate the missing evaluations only
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self._run_candidates([candidates[i] for i in missing], monte_carlo, n_simulations, master_seed, common_random_numbers)
+            for i, result in zip(missing, computed):
+                if keys[i] is not None:
+                    self.cache.put(keys[i], result)
+                results[i] = dict(result)
+
+        if monte_carlo and common_random_numbers:
+            add_paired_deltas(results)
+        return results
 
     # Check if a 1-stop strategy is physically realistic
     # Input: compounds (list of 2 str), pit_lap (int)
     # Output: bool (True if valid)
     # Precondition: compounds has 2 elements
-    # Postcondition: returns True if both stints are within max lengths
+    # Postcondition: returns True if both stints are non-empty and within max lengths, stints being counted as the
+    #                engine drives them (new tyres from the pit lap on), the same rule as optimize_nstop
     def is_valid_strategy(self, compounds: List[str], pit_lap: int) -> bool:
 
-        # First stint: lap 1 to pit_lap
-        stint1_length = pit_lap
-        if compounds[0] not in MAX_STINT_LENGTH:
-            raise ValueError(f"Unknown compound: {compounds[0]}")
-        if stint1_length > MAX_STINT_LENGTH[compounds[0]]:
-            return False
-        
-        # Second stint: lap (pit_lap + 1) to race_laps
-        stint2_length = self.engine.race_laps - pit_lap
-        if compounds[1] not in MAX_STINT_LENGTH:
-            raise ValueError(f"Unknown compound: {compounds[1]}")
-        if stint2_length > MAX_STINT_LENGTH[compounds[1]]:
+        for compound in compounds[:2]:
+            if compound not in MAX_STINT_LENGTH:
+                raise ValueError(f"Unknown compound: {compound}")
+
+        # Both stints need at least one lap: the pit lap is between lap 2 and the last lap
+        if not 2 <= pit_lap <= self.engine.race_laps:
             return False
-        
+
+        # First stint: lap 1 to pit_lap - 1, second stint: pit_lap to race_laps
+        for compound, (first_lap, last_lap) in zip(compounds, self.engine.stint_bounds([pit_lap])):
+            if last_lap - first_lap + 1 > MAX_STINT_LENGTH[compound]:
+                return False
+
         return True
 
     # Generate 1-Stop Combinations
@@ -59,40 +219,384 @@ class StrategyOptimizer:
             raise ValueError("At least 2 compounds required to generate 1-stop combinations")
         return [list(p) for p in permutations(available_compounds, 2)]
 
+    # Generate every valid 1-stop candidate
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int)
+    # Output: list of (compounds, pit_laps) candidates
+    # Precondition: at least 2 compounds available
+    # Postcondition: only realistic stints are kept, in a deterministic order
+    def generate_1stop_candidates(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int) -> List[Tuple[List[str], List[int]]]:
+
+        candidates = []
+        for compounds in self.generate_1stop_combinations(available_compounds):
+            for pit_lap in range(min_pit_lap, max_pit_lap + 1):
+                # Skip unrealistic strategies (stints too long for compound)
+                if self.is_valid_strategy(compounds, pit_lap):
+                    candidates.append((compounds, [pit_lap]))
+
+        return candidates
+
     # Compute and rank all 1-stop strategies
-    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), monte_carlo (bool), n_simulations (int)
-    # Output: list of strategies sorted by total_time
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), monte_carlo (bool), n_simulations (int), seed (int, optional),
+    #        common_random_numbers (bool)
+    # Output: list of strategies sorted by total_time (with delta_to_best and delta_std_error under common random numbers)
     # Precondition: min_pit_lap < max_pit_lap
-    # Postcondition: returns ranked strategy list with realistic stints only
-    def optimize_1stop(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, monte_carlo: bool = True, n_simulations: int = 100) -> List[Dict]:
+    # Postcondition: returns ranked strategy list with realistic stints only, identical for any n_workers given the same seed
+    @dm.timed("optimizer.optimize_1stop")
+    def optimize_1stop(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, monte_carlo: bool = True, n_simulations: int = 100, seed: Optional[int] = None, common_random_numbers: bool = False) -> List[Dict]:
         
         # If fewer than 2 compounds, return empty list (cannot do 1-stop)
         if len(available_compounds) < 2:
             return []
         
+        candidates = self.generate_1stop_candidates(available_compounds, min_pit_lap, max_pit_lap)
+        results = self.evaluate_candidates(candidates, monte_carlo, n_simulations, seed, common_random_numbers)
+
+        # Single pit lap instead of a list for 1-stop results
         all_results = []
-        combinations = self.generate_1stop_combinations(available_compounds)
+        for r in results:
+            pit_laps = r.pop("pit_laps")
+            all_results.append({"compounds": r.pop("compounds"), "pit_lap": pit_laps[0], **r})
 
-        for compounds in combinations:
-            for pit_lap in range(min_pit_lap, max_pit_lap + 1):
-                # Skip unrealistic strategies (stints too long for compound)
-                if not self.is_valid_strategy(compounds, pit_lap):
-                    continue
-
-                if monte_carlo:
-                    # Run Monte Carlo to get mean total time
-                    sim_result = self.engine.simulate_monte_carlo(compounds, [pit_lap], n_simulations=n_simulations)
-                    total_time = sim_result['mean_time']
-                    std_time = sim_result['std_time']
-                else:
-                    total_time = self.engine.simulate_strategy(compounds, [pit_lap])
-                    std_time = 0.0
-                
-                all_results.append({
-                    "compounds": compounds,
-                    "pit_lap": pit_lap,
-                    "total_time": total_time,
-                    "std_time": std_time
-                })
-
-        return sorted(all_results, key=lambda x: x["total_time"])
\ No newline at end of file
+        return sorted(all_results, key=lambda x: x["total_time"])
+
+    # Sensitivity map of the best 1-stop strategy over pit-lane loss, fuel effect and degradation scale
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), pit_deltas (sequence of float),
+    #        fuel_coefs (sequence of float), degradation_scales (sequence of float, optional)
+    # Output: dict from RaceEngine.sweep_parameters plus the evaluated "strategies" list (best_index indexes into it)
+    # Precondition: min_pit_lap < max_pit_lap
+    # Postcondition: the whole grid is evaluated as one broadcast array computation, without noise
+    @dm.timed("optimizer.sensitivity_sweep")
+    def sensitivity_sweep(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, pit_deltas, fuel_coefs, degradation_scales=None) -> Dict:
+
+        if len(available_compounds) < 2:
+            return {}
+
+        candidates = self.generate_1stop_candidates(available_compounds, min_pit_lap, max_pit_lap)
+        if not candidates:
+            return {}
+
+        sweep = self.engine.sweep_parameters(candidates, pit_deltas, fuel_coefs, degradation_scales)
+        sweep["strategies"] = candidates
+        return sweep
+
+    # Rank 1-stop strategies with an adaptive Monte Carlo budget (racing)
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), top_k (int), initial_simulations (int),
+    #        simulation_budget (int, optional), confidence_z (float), seed (int, optional)
+    # Output: list of strategies sorted by total_time, each with the number of simulations it received
+    # Precondition: min_pit_lap < max_pit_lap, initial_simulations >= 2
+    # Postcondition: every candidate gets initial_simulations runs, the remaining budget only goes to candidates
+    #                whose confidence interval still overlaps the current top_k
+    @dm.timed("optimizer.optimize_1stop_adaptive")
+    def optimize_1stop_adaptive(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, top_k: int = 5, initial_simulations: int = 20, simulation_budget: Optional[int] = None, confidence_z: float = 1.96, seed: Optional[int] = None) -> List[Dict]:
+
+        if len(available_compounds) < 2:
+            return []
+
+        candidates = self.generate_1stop_candidates(available_compounds, min_pit_lap, max_pit_lap)
+        if not candidates:
+            return []
+
+        # Default budget: a quarter of the fixed 100 simulations per candidate
+        if simulation_budget is None:
+            simulation_budget = 25 * len(candidates)
+
+        # One generator per candidate, so successive batches continue the same stream
+        master_seed = seed if seed is not None else np.random.SeedSequence().entropy
+        rngs = [np.random.default_rng(candidate_seed(master_seed, c, p)) for c, p in candidates]
+        samples = [[] for _ in candidates]
+
+        alive = list(range(len(candidates)))
+        batch = initial_simulations
+        runs_per_contender = 0
+        used = 0
+
+        while alive:
+            # Simulate one batch for every remaining contender
+            for i in alive:
+                compounds, pit_laps = candidates[i]
+                samples[i].append(self.engine.sample_race_times(compounds, pit_laps, batch, rngs[i]))
+            runs_per_contender += batch
+            used += batch * len(alive)
+
+            # Confidence interval of every contender
+            runs = [np.concatenate(samples[i]) for i in alive]
+            means = np.array([r.mean() for r in runs])
+            errors = confidence_z * np.array([r.std(ddof=1) for r in runs]) / np.sqrt([len(r) for r in runs])
+
+            # Drop candidates that cannot reach the current top_k, even at the edge of their interval
+            order = np.argsort(means, kind="stable")
+            kth = order[min(top_k, len(alive)) - 1]
+            threshold = means[kth] + errors[kth]
+            alive = [i for i, lower in zip(alive, means - errors) if lower <= threshold]
+
+            if len(alive) <= top_k:
+                break
+
+            # Successive halving: survivors double their number of runs while the budget allows it
+            batch = min(runs_per_contender, (simulation_budget - used) // len(alive))
+            if batch < 1:
+                break
+
+        all_results = []
+        for (compounds, pit_laps), runs in zip(candidates, samples):
+            runs = np.concatenate(runs)
+            all_results.append({
+                "compounds": compounds,
+                "pit_lap": pit_laps[0],
+                "total_time": float(runs.mean()),
+                "std_time": float(runs.std()),
+                "n_simulations": len(runs)
+            })
+
+        return sorted(all_results, key=lambda x: x["total_time"])
+
+    # Compute the top-k strategies with up to max_stops pit stops by dynamic programming
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), max_stops (int), min_stops (int), top_k (int), monte_carlo (bool), n_simulations (int), seed (int, optional),
+    #        common_random_numbers (bool)
+    # Output: list of at most top_k strategies sorted by total_time, each with compounds, pit_laps, total_time, std_time
+    # Precondition: 1 <= min_stops <= max_stops, every compound is listed in MAX_STINT_LENGTH
+    # Postcondition: every stint respects MAX_STINT_LENGTH, every pit lap is within [min_pit_lap, max_pit_lap],
+    #                and at least two different compounds are used
+    @dm.timed("optimizer.optimize_nstop")
+    def optimize_nstop(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, max_stops: int = 3, min_stops: int = 1, top_k: int = 5, monte_carlo: bool = False, n_simulations: int = 100, seed: Optional[int] = None, common_random_numbers: bool = False) -> List[Dict]:
+
+        # Two-compound rule cannot be satisfied with a single compound
+        if len(available_compounds) < 2:
+            return []
+
+        for compound in available_compounds:
+            if compound not in MAX_STINT_LENGTH:
+                raise ValueError(f"Unknown compound: {compound}")
+
+        engine = self.engine
+        race_laps = engine.race_laps
+        n_compounds = len(available_compounds)
+        max_length = [min(MAX_STINT_LENGTH[c], race_laps) for c in available_compounds]
+        tables = [engine.lap_time_table[c] for c in available_compounds]
+
+        # Deterministic time of stint `c` from lap first+1 to lap `last` for every boundary in `first`
+        def stint_costs(c: int, first: np.ndarray, last: int) -> np.ndarray:
+            fuel = engine.fuel_table[last] - engine.fuel_table[first]
+            return tables[c][last - first] - engine.fuel_coef * fuel
+
+        # DP state: (last completed lap, compound of the current stint, two compounds used yet, rank)
+        # values[s] holds the top_k best times with s + 1 stints, parents[s] the state each one extends
+        shape = (race_laps + 1, n_compounds, 2, top_k)
+        values = [np.full(shape, np.inf)]
+        parents = [None]
+
+        for c in range(n_compounds):
+            laps = np.arange(1, max_length[c] + 1)
+            values[0][laps, c, 0, 0] = stint_costs(c, np.zeros_like(laps), laps)
+
+        # Predecessor masks per (next compound, mixed flag): mixing happens as soon as two compounds differ
+        same = np.eye(n_compounds, dtype=bool)
+        mixed_masks = []
+        for c in range(n_compounds):
+            keep_single = np.zeros((n_compounds, 2), dtype=bool)
+            keep_single[c, 0] = True
+            keep_mixed = np.ones((n_compounds, 2), dtype=bool)
+            keep_mixed[:, 0] = ~same[c]
+            mixed_masks.append((keep_single, keep_mixed))
+
+        # A stint starting on the pit lap p follows the boundary p - 1
+        first_boundary = max(min_pit_lap - 1, 1)
+        last_boundary = min(max_pit_lap - 1, race_laps - 1)
+
+        for stop in range(1, max_stops + 1):
+            previous = values[-1]
+            current = np.full(shape, np.inf)
+            parent = np.zeros(shape + (4,), dtype=int)
+
+            for c in range(n_compounds):
+                for last in range(first_boundary + 1, race_laps + 1):
+                    low = max(last - max_length[c], first_boundary)
+                    high = min(last - 1, last_boundary)
+                    if low > high:
+                        continue
+
+                    boundaries = np.arange(low, high + 1)
+                    step = stint_costs(c, boundaries, last) + engine.pit_delta
+                    candidates = previous[low:high + 1] + step[:, None, None, None]
+
+                    for mixed, mask in enumerate(mixed_masks[c]):
+                        masked = np.where(mask[None, :, :, None], candidates, np.inf).ravel()
+                        if not np.isfinite(masked).any():
+                            continue
+
+                        # Keep the top_k predecessors for this state
+                        best = np.argsort(masked, kind="stable")[:top_k]
+                        best = best[np.isfinite(masked[best])]
+                        a, prev_c, prev_mixed, rank = np.unravel_index(best, candidates.shape)
+
+                        current[last, c, mixed, :len(best)] = masked[best]
+                        parent[last, c, mixed, :len(best)] = np.stack([a + low, prev_c, prev_mixed, rank], axis=1)
+
+            values.append(current)
+            parents.append(parent)
+
+        # Finished races with at least two compounds, over all allowed stop counts
+        finals = []
+        for stop in range(min_stops, max_stops + 1):
+            for c in range(n_compounds):
+                for rank in range(top_k):
+                    total_time = values[stop][race_laps, c, 1, rank]
+                    if np.isfinite(total_time):
+                        finals.append((float(total_time), stop, c, rank))
+
+        finals.sort(key=lambda x: x[0])
+
+        results = []
+        for total_time, stop, c, rank in finals[:top_k]:
+
+            # Walk the parent pointers back to the first stint
+            compounds = [available_compounds[c]]
+            pit_laps = []
+            last, mixed = race_laps, 1
+            for s in range(stop, 0, -1):
+                last, c, mixed, rank = parents[s][last, c, mixed, rank]
+                compounds.insert(0, available_compounds[c])
+                pit_laps.insert(0, int(last) + 1)
+
+            results.append({
+                "compounds": compounds,
+                "pit_laps": pit_laps,
+                "total_time": total_time,
+                "std_time": 0.0
+            })
+
+        # Re-score the deterministic top-k with Monte Carlo
+        if monte_carlo:
+            candidates = [(r["compounds"], r["pit_laps"]) for r in results]
+            results = self.evaluate_candidates(candidates, True, n_simulations, seed, common_random_numbers)
+            results.sort(key=lambda x: x["total_time"])
+
+        return results
+
+    # Stream the top-k strategies with branch-and-bound pruning
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), top_k (int), max_stops (int),
+    #        n_simulations (int), seed (int, optional), margin (float, optional), candidate_pool (int)
+    # Output: generator of at most top_k strategies in ranking order, each with its Monte Carlo total_time, std_time, lower_bound
+    #         and confirmed (False when the candidate pool was truncated before it could rule out better strategies)
+    # Precondition: min_pit_lap < max_pit_lap
+    # Postcondition: candidates are visited by increasing deterministic lower bound (zero noise) and simulated in batches of top_k;
+    #                the search stops as soon as the next lower bound exceeds the k-th best time plus margin,
+    #                and a leader is yielded once no remaining lower bound can beat it; multi-stop pools start with
+    #                candidate_pool strategies and are doubled (up to MAX_CANDIDATE_POOL) while the bound has not fired;
+    #                last_search_stats reports candidates, evaluated, pool_expansions and truncated
+    def iter_top_k(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, top_k: int = 5, max_stops: int = 1, n_simulations: int = 100, seed: Optional[int] = None, margin: Optional[float] = None, candidate_pool: int = 50) -> Iterator[Dict]:
+
+        self.last_search_stats = {"candidates": 0, "evaluated": 0, "pool_expansions": 0, "truncated": False}
+        if len(available_compounds) < 2:
+            return
+
+        # Candidates with their deterministic lower bound, cheapest first; exhausted once every strategy is listed
+        pool_size = max(candidate_pool, top_k)
+        if max_stops == 1:
+            candidates = self.generate_1stop_candidates(available_compounds, min_pit_lap, max_pit_lap)
+            bounds = [self.engine.strategy_time(c, p) for c, p in candidates]
+            exhausted = True
+        else:
+            candidates, bounds, exhausted = self._nstop_pool(available_compounds, min_pit_lap, max_pit_lap, max_stops, pool_size, [])
+
+        order = sorted(range(len(candidates)), key=lambda i: bounds[i])
+        candidates = [candidates[i] for i in order]
+        bounds = [bounds[i] for i in order]
+
+        # Same master seed for every batch, so results do not depend on the batching
+        master_seed = seed if seed is not None else np.random.SeedSequence().entropy
+
+        # Bounded heap of the current top_k (negated times, so the root is the k-th best), tie-broken by visiting order
+        leaders = []
+        emitted = 0
+        self.last_search_stats = {"candidates": len(candidates), "evaluated": 0, "pool_expansions": 0, "truncated": False}
+
+        start = 0
+        while True:
+
+            # Every listed candidate is evaluated but unlisted ones may still beat the leaders: widen the pool
+            if start >= len(candidates):
+                if exhausted:
+                    break
+                if pool_size >= MAX_CANDIDATE_POOL:
+                    self.last_search_stats["truncated"] = True
+                    break
+                pool_size = min(2 * pool_size, MAX_CANDIDATE_POOL)
+                more, more_bounds, exhausted = self._nstop_pool(available_compounds, min_pit_lap, max_pit_lap, max_stops, pool_size, candidates)
+                candidates += more
+                bounds += more_bounds
+                self.last_search_stats["candidates"] = len(candidates)
+                self.last_search_stats["pool_expansions"] += 1
+                continue
+
+            # Prune every remaining candidate once the cheapest of them cannot enter the top_k
+            if len(leaders) == top_k:
+                # Root of the min-heap of negated times: the slowest of the current leaders
+                kth = leaders[0][2]
+                if bounds[start] > kth["total_time"] + self._search_margin(kth, n_simulations, margin):
+                    break
+
+            batch = candidates[start:start + top_k]
+            results = self.evaluate_candidates(batch, True, n_simulations, seed, master_seed=master_seed)
+            self.last_search_stats["evaluated"] += len(batch)
+
+            for offset, result in enumerate(results):
+                result["lower_bound"] = bounds[start + offset]
+                if max_stops == 1:
+                    result["pit_lap"] = result["pit_laps"][0]
+                entry = (-result["total_time"], -(start + offset), result)
+                if len(leaders) < top_k:
+                    heapq.heappush(leaders, entry)
+                elif entry > leaders[0]:
+                    heapq.heapreplace(leaders, entry)
+            start += len(batch)
+
+            # Yield the leaders that no remaining candidate can beat anymore (unlisted candidates are no faster than the last listed one)
+            if start < len(candidates):
+                next_bound = bounds[start]
+            else:
+                next_bound = np.inf if exhausted else bounds[-1]
+            ranking = [entry[2] for entry in sorted(leaders, reverse=True)]
+            while emitted < len(ranking) and ranking[emitted]["total_time"] + self._search_margin(ranking[emitted], n_simulations, margin) < next_bound:
+                ranking[emitted]["confirmed"] = True
+                yield ranking[emitted]
+                emitted += 1
+
+        ranking = [entry[2] for entry in sorted(leaders, reverse=True)]
+        for result in ranking[emitted:]:
+            result["confirmed"] = not self.last_search_stats["truncated"]
+            yield result
+
+    # List the multi-stop candidates of a pool size by deterministic time
+    # Input: available_compounds (list of str), min_pit_lap (int), max_pit_lap (int), max_stops (int), pool_size (int),
+    #        listed (list of (compounds, pit_laps) already listed)
+    # Output: (candidates not listed yet sorted by lower bound, their lower bounds, exhausted flag)
+    # Precondition: max_stops >= 1
+    # Postcondition: exhausted is True when the dynamic program returned fewer strategies than pool_size (nothing left to list)
+    def _nstop_pool(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, max_stops: int, pool_size: int, listed: List[Tuple[List[str], List[int]]]) -> Tuple[List[Tuple[List[str], List[int]]], List[float], bool]:
+
+        # The dynamic program already enumerates multi-stop strategies by increasing deterministic time
+        pool = self.optimize_nstop(available_compounds, min_pit_lap, max_pit_lap, max_stops=max_stops, top_k=pool_size)
+        seen = {(tuple(compounds), tuple(pit_laps)) for compounds, pit_laps in listed}
+        fresh = [r for r in pool if (tuple(r["compounds"]), tuple(r["pit_laps"])) not in seen]
+        return [(r["compounds"], r["pit_laps"]) for r in fresh], [r["total_time"] for r in fresh], len(pool) < pool_size
+
+    # Confidence margin used to compare a Monte Carlo mean with deterministic lower bounds
+    # Input: result (dict with std_time), n_simulations (int), margin (float, optional)
+    # Output: margin (float, seconds)
+    # Precondition: none
+    # Postcondition: returns margin when given, otherwise three standard errors of the difference between
+    #                two independent means (the unevaluated candidate's mean is as noisy as this one)
+    def _search_margin(self, result: Dict, n_simulations: int, margin: Optional[float]) -> float:
+        if margin is not None:
+            return margin
+        return 3.0 * np.sqrt(2.0) * result["std_time"] / np.sqrt(n_simulations)
+
+    # Top-k strategies with branch-and-bound pruning
+    # Input: same as iter_top_k
+    # Output: list of at most top_k strategies sorted by total_time
+    # Precondition: min_pit_lap < max_pit_lap
+    # Postcondition: same strategies as iter_top_k, collected in a list
+    @dm.timed("optimizer.optimize_top_k")
+    def optimize_top_k(self, available_compounds: List[str], min_pit_lap: int, max_pit_lap: int, top_k: int = 5, max_stops: int = 1, n_simulations: int = 100, seed: Optional[int] = None, margin: Optional[float] = None, candidate_pool: int = 50) -> List[Dict]:
+        return list(self.iter_top_k(available_compounds, min_pit_lap, max_pit_lap, top_k, max_stops, n_simulations, seed, margin, candidate_pool))
@@ -0,0 +1,134 @@
+# Author: Loussouarn Kévin
+# Date: 18/10/2026
+# Description: Persistent SQLite store of fitted tyre-model parameters (no FastF1 needed to read them back)
+
+from typing import Dict, Iterator, List, Optional
+from contextlib import contextmanager
+from datetime import timedelta
+import os
+import sqlite3
+import threading
+import time
+
+# Default location, next to the FastF1 cache
+DEFAULT_STORE_PATH = os.path.join("cache", "tyre_parameters.sqlite")
+# Version of the fitting procedure: bump it when Predictor changes so older fits are ignored
+FIT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tyre_parameters (
+    season INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    session TEXT NOT NULL,
+    driver TEXT NOT NULL,
+    compound TEXT NOT NULL,
+    fit_version INTEGER NOT NULL,
+    base_pace REAL NOT NULL,
+    degradation REAL NOT NULL,
+    variance REAL NOT NULL,
+    fitted_at REAL NOT NULL,
+    PRIMARY KEY (season, event, session, driver, compound, fit_version)
+)
+"""
+
+
+# Store of per-compound base_pace / degradation / variance keyed by season, event, session and driver.
+class ParameterStore:
+
+    # Constructor
+    # Input: path (str), fit_version (int)
+    # Output: ParameterStore object
+    # Precondition: the parent directory of path is writable
+    # Postcondition: the database file and its table exist
+    def __init__(self, path: str = DEFAULT_STORE_PATH, fit_version: int = FIT_VERSION):
+        self.path = path
+        self.fit_version = fit_version
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with self._connect() as connection:
+            connection.execute(SCHEMA)
+
+    # Open a connection to the database for one transaction
+    # Input: none
+    # Output: context manager yielding a sqlite3.Connection
+    # Precondition: none
+    # Postcondition: the transaction is committed (or rolled back on error) and the connection is closed
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    # Save the fitted parameters of one driver (replaces a previous fit of the same version)
+    # Input: season (int), event (str), session (str), driver (str), parameters (Dict[compound -> dict with base_pace (timedelta), degradation, variance])
+    # Output: none
+    # Precondition: parameters has the Predictor.get_parameters format
+    # Postcondition: every compound is stored in a single transaction
+    def save(self, season: int, event: str, session: str, driver: str, parameters: Dict[str, Dict]) -> None:
+        fitted_at = time.time()
+        rows = [
+            (int(season), event, session, driver, compound, self.fit_version,
+             params["base_pace"].total_seconds(), float(params["degradation"]), float(params["variance"]), fitted_at)
+            for compound, params in parameters.items()
+        ]
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "DELETE FROM tyre_parameters WHERE season = ? AND event = ? AND session = ? AND driver = ? AND fit_version = ?",
+                (int(season), event, session, driver, self.fit_version)
+            )
+            connection.executemany("INSERT INTO tyre_parameters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # Save the fitted parameters of several drivers of the same session
+    # Input: season (int), event (str), session (str), parameters_by_driver (Dict[driver -> parameters])
+    # Output: none
+    # Precondition: every value has the Predictor.get_parameters format
+    # Postcondition: drivers with no parameters are skipped
+    def save_many(self, season: int, event: str, session: str, parameters_by_driver: Dict[str, Dict[str, Dict]]) -> None:
+        for driver, parameters in parameters_by_driver.items():
+            if parameters:
+                self.save(season, event, session, driver, parameters)
+
+    # Load the parameters of one driver
+    # Input: season (int), event (str), session (str), driver (str)
+    # Output: Dict[compound -> dict with base_pace (timedelta), degradation, variance], or None if not stored
+    # Precondition: none
+    # Postcondition: only fits of the current fit_version are returned, ready for RaceEngine
+    def load(self, season: int, event: str, session: str, driver: str) -> Optional[Dict[str, Dict]]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT compound, base_pace, degradation, variance FROM tyre_parameters "
+                "WHERE season = ? AND event = ? AND session = ? AND driver = ? AND fit_version = ?",
+                (int(season), event, session, driver, self.fit_version)
+            ).fetchall()
+
+        if not rows:
+            return None
+
+        return {
+            compound: {
+                "base_pace": timedelta(seconds=base_pace),
+                "degradation": degradation,
+                "variance": variance
+            }
+            for compound, base_pace, degradation, variance in rows
+        }
+
+    # List the drivers stored for a session
+    # Input: season (int), event (str), session (str)
+    # Output: sorted list of driver codes
+    # Precondition: none
+    # Postcondition: only fits of the current fit_version are considered
+    def drivers(self, season: int, event: str, session: str) -> List[str]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT DISTINCT driver FROM tyre_parameters WHERE season = ? AND event = ? AND session = ? AND fit_version = ? ORDER BY driver",
+                (int(season), event, session, self.fit_version)
+            ).fetchall()
+        return [row[0] for row in rows]
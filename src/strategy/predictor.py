@@ -3,11 +3,150 @@
 # Description: Predictor module for practice-based F1 race strategy engine
 
 # === Imports ===
-from typing import Dict, List
+from typing import Dict, List, Optional
+from collections import OrderedDict
 from datetime import timedelta
+import weakref
 import pandas as pd
 import numpy as np
 from fastf1.core import Session
+from src.diagnostics import metrics as dm
+
+# Key identifying a stint of one driver (stint numbers restart in every session)
+STINT_KEYS = ["session", "Compound", "Stint"]
+# Number of fitted grids kept in memory (one per loaded set of sessions)
+GRID_CACHE_SIZE = 8
+# Minimum number of kept laps for a stint to count as a long run
+MIN_LONG_RUN_LAPS = 3
+
+
+# Filter the laps of long green-flag stints in one pass
+# Input: all_laps (DataFrame with 'session', 'LapTime', 'Compound', 'Stint'), min_laps (int), pace_keys (list of columns sharing a median pace),
+#        median_pace (optional Series aligned on all_laps, replaces the median computed from all_laps)
+# Output: DataFrame of the kept laps with a 'LapSeconds' column
+# Precondition: laps of a stint are in lap order
+# Postcondition: only green-flag laps within 120% of their pace group's median, in stints (pace_keys + Compound + Stint)
+#                of at least min_laps laps, are kept
+def filter_long_runs(all_laps: pd.DataFrame, min_laps: int, pace_keys: List[str], median_pace: Optional[pd.Series] = None) -> pd.DataFrame:
+
+    # Convert lap time to seconds once for easier calculations
+    lap_seconds = all_laps["LapTime"].dt.total_seconds()
+
+    # Filter invalid laps and non-green laps (e.g. yellow flags, safety car)
+    keep = lap_seconds.notna() & all_laps["Compound"].notna()
+    if 'TrackStatus' in all_laps.columns:
+        keep &= all_laps['TrackStatus'] == '1'
+
+    # Remove extreme slow laps (likely pit / traffic), against the group's own median pace
+    if median_pace is None:
+        median_pace = lap_seconds.where(keep).groupby([all_laps[k] for k in pace_keys], observed=True).transform("median")
+    keep &= lap_seconds < median_pace * 1.2
+
+    laps = all_laps[keep].assign(LapSeconds=lap_seconds[keep])
+
+    # Stint sizes from one groupby, short stints are dropped without splitting the frame
+    stint_size = laps.groupby(pace_keys + ["Compound", "Stint"], sort=False, observed=True)["LapSeconds"].transform("size")
+    return laps[stint_size >= min_laps]
+
+
+# Compute the regression sufficient statistics of every stint at once
+# Input: laps (DataFrame with 'LapSeconds' and the key columns, in lap order), keys (list of column names identifying a stint)
+# Output: DataFrame indexed by keys with n, sum_x, sum_y, sum_xy, sum_xx, mean_y and m2_y (sum of squared deviations of y)
+# Precondition: laps of a stint are in lap order
+# Postcondition: x is the lap index within the stint (0, 1, ...), y the lap time in seconds
+def stint_statistics(laps: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+
+    x = laps.groupby(keys, sort=False, observed=True).cumcount().astype(float)
+    y = laps["LapSeconds"]
+    terms = laps[keys].assign(x=x, y=y, xy=x * y, xx=x * x)
+
+    stats = terms.groupby(keys, sort=False, observed=True).agg(
+        n=("y", "size"),
+        sum_x=("x", "sum"),
+        sum_y=("y", "sum"),
+        sum_xy=("xy", "sum"),
+        sum_xx=("xx", "sum"),
+        mean_y=("y", "mean"),
+        var_y=("y", "var")
+    )
+    stats["m2_y"] = (stats.pop("var_y") * (stats["n"] - 1)).fillna(0.0)
+    return stats
+
+
+# Fold the statistics of new laps into the running statistics of their stints
+# Input: stats (DataFrame from stint_statistics, or None), new (DataFrame from stint_statistics on the new laps only)
+# Output: DataFrame with the same columns, indexed by the union of both indexes (existing stints first)
+# Precondition: new laps of an existing stint directly follow its previous laps
+# Postcondition: equals stint_statistics on all laps at once; lap indexes of the new laps are shifted by the laps
+#                already seen and the y moments are merged with Chan's parallel update (cost proportional to the new stints)
+def merge_stint_statistics(stats: Optional[pd.DataFrame], new: pd.DataFrame) -> pd.DataFrame:
+    if stats is None or stats.empty:
+        return new
+
+    old = stats.reindex(new.index).fillna(0.0)
+    n0, m = old["n"], new["n"]
+    n = n0 + m
+    delta = new["mean_y"] - old["mean_y"]
+
+    merged = pd.DataFrame({
+        "n": n.astype(int),
+        "sum_x": old["sum_x"] + new["sum_x"] + m * n0,
+        "sum_y": old["sum_y"] + new["sum_y"],
+        "sum_xy": old["sum_xy"] + new["sum_xy"] + n0 * new["sum_y"],
+        "sum_xx": old["sum_xx"] + new["sum_xx"] + 2 * n0 * new["sum_x"] + m * n0 ** 2,
+        "mean_y": old["mean_y"] + delta * m / n,
+        "m2_y": old["m2_y"] + new["m2_y"] + delta ** 2 * n0 * m / n
+    }, index=new.index)
+
+    # Keep the order in which stints were first seen
+    order = stats.index.append(new.index[~new.index.isin(stats.index)])
+    return pd.concat([stats[~stats.index.isin(new.index)], merged]).reindex(order)
+
+
+# Fit every stint in closed form and average the fits per group
+# Input: stats (DataFrame from stint_statistics), by (list of index levels to aggregate over, e.g. ["Compound"])
+# Output: DataFrame indexed by `by` with base_pace (seconds), degradation, variance, residual_std, laps and stints
+# Precondition: stats has the index levels listed in `by`
+# Postcondition: slopes and intercepts equal a per-stint least-squares fit of lap time against lap index,
+#                variance is the standard deviation of all lap times of the group
+def fit_stint_statistics(stats: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+
+    # A line needs at least two laps
+    stats = stats[stats["n"] >= 2]
+
+    n, sx, sy = stats["n"], stats["sum_x"], stats["sum_y"]
+    sxy_centered = stats["sum_xy"] - sx * sy / n
+    sxx_centered = stats["sum_xx"] - sx * sx / n
+
+    slope = sxy_centered / sxx_centered
+    intercept = (sy - slope * sx) / n
+    residual_ss = (stats["m2_y"] - slope * sxy_centered).clip(lower=0.0)
+
+    stints = pd.DataFrame({
+        "slope": slope,
+        "intercept": intercept,
+        "n": n,
+        "mean_y": stats["mean_y"],
+        "m2_y": stats["m2_y"],
+        "residual_ss": residual_ss
+    })
+    groups = stints.groupby(level=by, sort=False, observed=True)
+
+    # Pooled variance of all lap times of the group (parallel Welford merge of the stints)
+    laps = groups["n"].sum()
+    pooled_mean = (stints["n"] * stints["mean_y"]).groupby(level=by, sort=False, observed=True).transform("sum") / groups["n"].transform("sum")
+    spread = stints["n"] * (stints["mean_y"] - pooled_mean) ** 2
+    pooled_m2 = (stints["m2_y"] + spread).groupby(level=by, sort=False, observed=True).sum()
+
+    return pd.DataFrame({
+        "base_pace": groups["intercept"].mean(),
+        "degradation": groups["slope"].mean(),
+        "variance": np.sqrt(pooled_m2 / laps),
+        "residual_std": np.sqrt(groups["residual_ss"].sum() / laps),
+        "laps": laps,
+        "stints": groups.size()
+    })
+
 
 # Extract predictive parameters from practice sessions for a single driver.
 # This module builds a model that can predict race performance.
@@ -22,109 +161,245 @@ class Predictor:
         self.sessions = sessions
         self.driver = driver
         self.parameters = {}
+        self.diagnostics = None
 
-    # Extract long stints per tyre compound
+        # Running sufficient statistics per (session, compound, stint), the reference pace of each session
+        # and the names of the sessions already folded in (constructor sessions are folded in lazily)
+        self.stint_stats = None
+        self.session_pace = {}
+        self.folded_sessions = set()
+        # Laps of the driver folded in, before the long-run filters (stint_stats only holds the kept ones)
+        self.folded_laps = 0
+
+    # Extract the laps of every long stint in one pass over all sessions
     # Input: min_laps (int) – minimum number of laps to consider a stint
-    # Output: Dict[compound -> list of DataFrames], each DataFrame = stint
+    # Output: DataFrame of the kept laps with 'session' and 'LapSeconds' columns, in session and lap order
     # Precondition: session contains laps with valid LapTime and Compound data
-    # Postcondition: Only stints with at least min_laps laps are returned
-    def extract_long_runs(self, min_laps: int = 3) -> Dict[str, List[pd.DataFrame]]:
+    # Postcondition: only green-flag laps within 120% of their session's median pace, in stints of at least min_laps laps, are kept
+    def extract_long_run_laps(self, min_laps: int = MIN_LONG_RUN_LAPS) -> pd.DataFrame:
 
-        # Combine all laps from all sessions for the driver
-        all_laps = pd.DataFrame()
-
-        # Loop through all sessions
+        # Collect the driver's laps of every session, concatenated once
+        frames = []
         for session_name, session in self.sessions.items():
             if not hasattr(session, 'laps') or session.laps is None:
                 continue
+            frames.append(session.laps.pick_drivers(self.driver).assign(session=session_name))
 
-            laps = session.laps.pick_drivers(self.driver).reset_index()
-            laps['session'] = session_name  # optional: track which session each lap comes from
-            all_laps = pd.concat([all_laps, laps], ignore_index=True)
-
+        all_laps = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
         if all_laps.empty:
             raise ValueError(f"No laps found for driver {self.driver} in any session.")
 
-        # Filter invalid laps
-        laps = laps[laps['LapTime'].notna()]
-        # Filter out non-green laps (e.g. yellow flags, safety car)
-        if 'TrackStatus' in laps.columns: 
-            laps = laps[laps['TrackStatus'] == '1']
+        # Median pace per session (session is part of the stint key: stint numbers restart in every session)
+        return filter_long_runs(all_laps, min_laps, ["session"])
 
-        # Convert lap time to seconds for easier calculations
-        laps["LapSeconds"] = laps["LapTime"].dt.total_seconds()
+    # Extract long stints per tyre compound
+    # Input: min_laps (int) – minimum number of laps to consider a stint
+    # Output: Dict[compound -> list of DataFrames], each DataFrame = stint
+    # Precondition: session contains laps with valid LapTime and Compound data
+    # Postcondition: Only stints with at least min_laps laps are returned
+    def extract_long_runs(self, min_laps: int = MIN_LONG_RUN_LAPS) -> Dict[str, List[pd.DataFrame]]:
 
-        # Remove extreme slow laps (likely pit / traffic)
-        median_pace = laps["LapSeconds"].median()
-        laps = laps[laps["LapSeconds"] < median_pace * 1.2]
+        laps = self.extract_long_run_laps(min_laps)
 
-        # Group by compound and stint, only keep stints with at least min_laps laps
+        # Split the kept laps into stints, grouped by compound in order of appearance
         stints_dict = {}
-        for compound in laps["Compound"].dropna().unique():
-
-            compound_laps = laps[laps["Compound"] == compound]
-            stints = []
-            for stint_number, stint_df in compound_laps.groupby("Stint"):
-                if len(stint_df) >= min_laps:
-                    stints.append(stint_df.copy())
-
-            if stints:
-                stints_dict[compound] = stints
+        for (compound, _, _), stint_df in laps.groupby(["Compound", "session", "Stint"], sort=False, observed=True):
+            stints_dict.setdefault(compound, []).append(stint_df)
 
         return stints_dict
 
-    # Estimate base pace, degradation, and variance per compound
+    # Fold new laps (of a new session, or laps appended to a session already seen) into the running statistics
+    # Input: laps (Laps / DataFrame, may contain other drivers), session_name (str)
+    # Output: number of laps kept for the model (int)
+    # Precondition: laps are in lap order and continue the laps of that session already folded in
+    # Postcondition: cost is proportional to the new laps, earlier sessions are not rescanned; the median pace of a session
+    #                is fixed by its first batch; constructor sessions not folded in yet are folded in first;
+    #                the parameters are refitted from the statistics on the next get_parameters
+    @dm.timed("predictor.update")
+    def update(self, laps: pd.DataFrame, session_name: str) -> int:
+        self._fold_sessions()
+        self.folded_sessions.add(session_name)
+        return self._fold_laps(laps, session_name)
+
+    # Fold in the constructor sessions that have not been folded in yet
     # Input: none
-    # Output: Dict[compound -> dict with keys 'base_pace', 'degradation', 'variance']
-    # Precondition: extract_long_runs must return at least one valid stint
-    # Postcondition: self.parameters is populated and returned
-    def estimate_parameters(self) -> Dict[str, Dict[str, float]]:
+    # Output: none
+    # Precondition: none
+    # Postcondition: every session of self.sessions is folded in exactly once, in dictionary order
+    def _fold_sessions(self) -> None:
+        for session_name, session in self.sessions.items():
+            if session_name in self.folded_sessions:
+                continue
+            self.folded_sessions.add(session_name)
+            if hasattr(session, 'laps') and session.laps is not None:
+                self._fold_laps(session.laps, session_name)
 
-        # Extract stints
-        stints = self.extract_long_runs()
-        params = {}
+    # Fold laps into the running statistics (see update)
+    # Input: laps (Laps / DataFrame, may contain other drivers), session_name (str)
+    # Output: number of laps kept for the model (int)
+    # Precondition: same as update
+    # Postcondition: same as update, without folding the constructor sessions
+    def _fold_laps(self, laps: pd.DataFrame, session_name: str) -> int:
 
-        # For each compound, fit a linear model to lap times vs lap number to estimate degradation
-        for compound, stint_list in stints.items():
+        if laps is None or laps.empty:
+            return 0
+        if "Driver" in laps.columns:
+            laps = laps[laps["Driver"] == self.driver]
+        if laps.empty:
+            return 0
+        laps = pd.DataFrame(laps).assign(session=session_name)
+        self.folded_laps += len(laps)
 
-            # Collect lap times and fit linear regression for each stint, then average results
-            slopes = []
-            intercepts = []
-            all_times = []
+        # Short stints are kept in the statistics: they may become long runs as laps arrive
+        if session_name not in self.session_pace:
+            kept = filter_long_runs(laps, 1, ["session"])
+            green = laps["LapTime"].dt.total_seconds().where(laps["Compound"].notna())
+            if 'TrackStatus' in laps.columns:
+                green = green.where(laps['TrackStatus'] == '1')
+            self.session_pace[session_name] = green.median()
+        else:
+            kept = filter_long_runs(laps, 1, ["session"], pd.Series(self.session_pace[session_name], index=laps.index))
 
-            for stint in stint_list:
-                lap_times = stint['LapTime'].dt.total_seconds().values
-                if len(lap_times) < 2:
-                    continue
+        if not kept.empty:
+            self.stint_stats = merge_stint_statistics(self.stint_stats, stint_statistics(kept, STINT_KEYS))
+            self.parameters = {}
+        return len(kept)
 
-                x = np.arange(len(lap_times))
-                y = lap_times
+    # Estimate base pace, degradation, and variance per compound
+    # Input: none
+    # Output: Dict[compound -> dict with keys 'base_pace', 'degradation', 'variance']
+    # Precondition: the sessions (or the laps folded in with update) contain at least one valid stint
+    # Postcondition: self.parameters is populated and returned, self.diagnostics holds the per-compound fit
+    #                diagnostics (residual_std, laps, stints); both are empty when no lap passes the long-run filters
+    @dm.timed("predictor.fit")
+    def estimate_parameters(self) -> Dict[str, Dict[str, float]]:
 
-                A = np.vstack([x, np.ones(len(x))]).T
-                slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
+        # Fold every session in once, later sessions arrive through update
+        self._fold_sessions()
+        if self.folded_laps == 0:
+            raise ValueError(f"No laps found for driver {self.driver} in any session.")
 
-                slopes.append(slope)
-                intercepts.append(intercept)
-                all_times.extend(y)
+        # Laps exist but none is a green-flag lap of a usable stint
+        if self.stint_stats is None:
+            self.diagnostics = pd.DataFrame(columns=["residual_std", "laps", "stints"], index=pd.Index([], name="Compound"))
+            self.parameters = {}
+            return self.parameters
 
-            if not slopes:
-                continue
+        # Fit every stint at once from grouped sums instead of one least-squares solve per stint
+        stats = self.stint_stats[self.stint_stats["n"] >= MIN_LONG_RUN_LAPS]
+        fit = fit_stint_statistics(stats, ["Compound"])
 
+        params = {}
+        for compound, row in fit.iterrows():
             params[compound] = {
-                "base_pace": timedelta(seconds=float(np.mean(intercepts))),      
-                "degradation": float(np.mean(slopes)),                           
-                "variance": float(np.std(all_times))                             
+                "base_pace": timedelta(seconds=float(row["base_pace"])),
+                "degradation": float(row["degradation"]),
+                "variance": float(row["variance"])
             }
 
+        self.diagnostics = fit[["residual_std", "laps", "stints"]]
         self.parameters = params
         return params
 
-    # Return estimated parameters, compute if not already done
+    # Return estimated parameters, compute if not already done (or if laps were folded in since)
     # Input: none
     # Output: Dict[compound -> dict with keys 'base_pace', 'degradation', 'variance']
     # Precondition: self.session is set
-    # Postcondition: returns dict of predictive parameters per compound
+    # Postcondition: returns dict of predictive parameters per compound, refitted from the running statistics only
     def get_parameters(self) -> Dict[str, Dict[str, float]]:
         if not self.parameters:
             self.estimate_parameters()
-        return self.parameters
\ No newline at end of file
+        return self.parameters
+
+
+# Fit the tyre model of every driver of the sessions in one pass.
+# Laps are processed once, grouped by (Driver, session, Compound, Stint).
+class GridPredictor:
+
+    # Constructor
+    # Input: sessions (dict of session_type -> Session)
+    # Output: GridPredictor object
+    # Precondition: sessions must contain at least one practice session
+    # Postcondition: GridPredictor object is initialized, parameters are fitted on first use
+    #                (the sessions are released once fitted, so a cached predictor does not keep them alive)
+    def __init__(self, sessions: Dict[str, Session]):
+        self.sessions = sessions
+        self.parameters_table = None
+
+    # Estimate base pace, degradation and variance per driver and compound
+    # Input: min_laps (int) – minimum number of laps to consider a stint
+    # Output: DataFrame indexed by (Driver, Compound) with base_pace (seconds), degradation, variance, residual_std, laps, stints
+    # Precondition: sessions contain laps with valid LapTime and Compound data, the predictor has not been fitted yet
+    # Postcondition: self.parameters_table is populated and returned, self.sessions is released
+    @dm.timed("predictor.grid_fit")
+    def estimate_parameters(self, min_laps: int = MIN_LONG_RUN_LAPS) -> pd.DataFrame:
+
+        if self.sessions is None:
+            raise ValueError("Sessions were released after fitting, create a new GridPredictor to refit.")
+
+        frames = []
+        for session_name, session in self.sessions.items():
+            if not hasattr(session, 'laps') or session.laps is None:
+                continue
+            frames.append(pd.DataFrame(session.laps).assign(session=session_name))
+
+        all_laps = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if all_laps.empty:
+            raise ValueError("No laps found in any session.")
+
+        # Same filters and fit as Predictor, with the driver added to every key
+        laps = filter_long_runs(all_laps, min_laps, ["Driver", "session"])
+        stats = stint_statistics(laps, ["Driver"] + STINT_KEYS)
+        self.parameters_table = fit_stint_statistics(stats, ["Driver", "Compound"])
+        self.sessions = None
+        return self.parameters_table
+
+    # Return the parameters of one driver, in the Predictor.get_parameters format
+    # Input: driver (str)
+    # Output: Dict[compound -> dict with keys 'base_pace', 'degradation', 'variance'] (empty if no long runs)
+    # Precondition: none
+    # Postcondition: parameters are fitted once for the whole grid, later calls are lookups
+    def get_driver_parameters(self, driver: str) -> Dict[str, Dict[str, float]]:
+        if self.parameters_table is None:
+            self.estimate_parameters()
+
+        if driver not in self.parameters_table.index.get_level_values("Driver"):
+            return {}
+
+        params = {}
+        for compound, row in self.parameters_table.loc[driver].iterrows():
+            params[compound] = {
+                "base_pace": timedelta(seconds=float(row["base_pace"])),
+                "degradation": float(row["degradation"]),
+                "variance": float(row["variance"])
+            }
+        return params
+
+
+# Fitted grids of the currently loaded sessions (key -> (weak references to the sessions, GridPredictor))
+_grid_cache = OrderedDict()
+
+
+# Return the cached GridPredictor of a set of loaded sessions
+# Input: sessions (dict of session_type -> Session)
+# Output: GridPredictor
+# Precondition: none
+# Postcondition: the same loaded sessions always return the same (already fitted) predictor,
+#                at most GRID_CACHE_SIZE grids are kept; the cache only holds weak references to the sessions
+def get_grid_predictor(sessions: Dict[str, Session]) -> GridPredictor:
+
+    key = tuple((name, id(session)) for name, session in sessions.items())
+
+    # Identity check: an id can be reused once its session has been garbage collected
+    cached: Optional[tuple] = _grid_cache.get(key)
+    if cached is not None and all(ref() is session for ref, session in zip(cached[0], sessions.values())):
+        _grid_cache.move_to_end(key)
+        return cached[1]
+
+    # Fitted before caching: the predictor then drops its sessions, which stay evictable from the session cache
+    predictor = GridPredictor(sessions)
+    predictor.estimate_parameters()
+    _grid_cache[key] = ([weakref.ref(session) for session in sessions.values()], predictor)
+    while len(_grid_cache) > GRID_CACHE_SIZE:
+        _grid_cache.popitem(last=False)
+    return predictor
@@ -2,25 +2,75 @@
 # Date: 25/02/2026
 # Description: Race simulation engine using Predictor output
 
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 from datetime import timedelta
 import math
 
+# Number of Monte Carlo runs drawn per noise matrix (bounds memory for large batches)
+MC_CHUNK_SIZE = 8192
+
+# Default safety-car (SC) / virtual safety-car (VSC) model
+DEFAULT_NEUTRALIZATION = {
+    "sc_rate": 0.01,          # probability that a safety car starts on a given lap
+    "vsc_rate": 0.01,         # probability that a virtual safety car starts on a given lap
+    "sc_duration": (3, 6),    # min / max laps under safety car
+    "vsc_duration": (1, 3),   # min / max laps under virtual safety car
+    "sc_lap_factor": 1.4,     # lap time multiplier behind the safety car
+    "vsc_lap_factor": 1.3,    # lap time multiplier under virtual safety car
+    "sc_pit_factor": 0.5,     # share of pit_delta lost when pitting under safety car
+    "vsc_pit_factor": 0.7     # share of pit_delta lost when pitting under virtual safety car
+}
+
+
+# Build a neutralization model for a track
+# Input: overrides (track-specific values for DEFAULT_NEUTRALIZATION keys, e.g. sc_rate=0.03)
+# Output: dict usable as RaceEngine neutralization
+# Precondition: overrides only use DEFAULT_NEUTRALIZATION keys
+# Postcondition: missing values are taken from DEFAULT_NEUTRALIZATION
+def neutralization_model(**overrides) -> Dict[str, float]:
+    unknown = set(overrides) - set(DEFAULT_NEUTRALIZATION)
+    if unknown:
+        raise ValueError(f"Unknown neutralization parameters: {sorted(unknown)}")
+    return {**DEFAULT_NEUTRALIZATION, **overrides}
+
+
 # Simulate a full race using predictive tyre parameters.
 class RaceEngine:
 
     # Constructor
-    # Input: parameters (dict from Predictor.get_parameters()), race_laps (int), fuel_coef (float), pit_delta (float), use_stochastic (bool)
+    # Input: parameters (dict from Predictor.get_parameters()), race_laps (int), fuel_coef (float), pit_delta (float), use_stochastic (bool),
+    #        neutralization (dict from neutralization_model, optional)
     # Output: RaceEngine object
     # Precondition: parameters contains at least one compound
-    # Postcondition: Engine ready to simulate strategies
-    def __init__(self, parameters: Dict[str, Dict[str, float]], race_laps: int, fuel_coef: float = 0.035, pit_delta: float = 22.0, use_stochastic: bool = False):
+    # Postcondition: Engine ready to simulate strategies (call build_tables again after changing parameters or race_laps),
+    #                Monte Carlo runs sample SC/VSC periods when neutralization is given
+    def __init__(self, parameters: Dict[str, Dict[str, float]], race_laps: int, fuel_coef: float = 0.035, pit_delta: float = 22.0, use_stochastic: bool = False, neutralization: Optional[Dict[str, float]] = None):
         self.parameters = parameters
         self.race_laps = race_laps
         self.fuel_coef = fuel_coef
         self.pit_delta = pit_delta
         self.use_stochastic = use_stochastic
+        self.neutralization = neutralization
+        self.build_tables()
+
+    # Precompute cumulative lap-time tables used for O(stints) strategy scoring
+    # Input: none
+    # Output: none
+    # Precondition: parameters and race_laps are set
+    # Postcondition: lap_time_table[compound][k] is the deterministic tyre time of the first k laps of a stint,
+    #                fuel_table[k] the remaining-fuel laps summed over race laps 1..k (to be scaled by fuel_coef)
+    def build_tables(self) -> None:
+        laps = np.arange(1, self.race_laps + 1)
+
+        # Degradation shape only depends on the stint lap, shared by all compounds
+        self.wear_table = np.concatenate(([0.0], np.cumsum(np.exp(0.08 * laps) - 1)))
+        self.fuel_table = np.concatenate(([0.0], np.cumsum(self.race_laps - laps, dtype=float)))
+
+        self.lap_time_table = {}
+        for compound, params in self.parameters.items():
+            base = params["base_pace"].total_seconds()
+            self.lap_time_table[compound] = base * np.arange(self.race_laps + 1) + params["degradation"] * self.wear_table
 
     # Compute predicted lap time for a given compound and stint lap number
     # Input: compound (str), stint_lap (int), current_lap (int)
@@ -48,6 +98,139 @@ class RaceEngine:
 
         return lap_time
 
+    # Deterministic time of a single stint from the precomputed tables
+    # Input: compound (str), first_lap (int), last_lap (int)
+    # Output: stint time (float, seconds)
+    # Precondition: 1 <= first_lap <= last_lap <= race_laps, compound exists in parameters
+    # Postcondition: equals the sum of compute_lap_time without noise over the stint laps
+    def stint_time(self, compound: str, first_lap: int, last_lap: int) -> float:
+        tyre_time = self.lap_time_table[compound][last_lap - first_lap + 1]
+        fuel_time = -self.fuel_coef * (self.fuel_table[last_lap] - self.fuel_table[first_lap - 1])
+        return float(tyre_time + fuel_time)
+
+    # Split the race into stints
+    # Input: pit_laps (list of int)
+    # Output: list of (first_lap, last_lap) per stint, one more than the number of pit stops in the race
+    # Precondition: none
+    # Postcondition: pit laps outside the race are ignored, duplicates only count once,
+    #                a pit on lap 1 leaves an empty first stint (last_lap < first_lap)
+    def stint_bounds(self, pit_laps: List[int]) -> List[Tuple[int, int]]:
+        stops = sorted({lap for lap in pit_laps if 1 <= lap <= self.race_laps})
+        starts = [1] + stops
+        ends = [lap - 1 for lap in stops] + [self.race_laps]
+        return list(zip(starts, ends))
+
+    # Deterministic total time of a strategy in O(number of stints)
+    # Input: compounds (list of str), pit_laps (list of int)
+    # Output: total_time (float, seconds)
+    # Precondition: len(compounds) > number of pit laps within the race
+    # Postcondition: equals simulate_strategy without noise
+    def strategy_time(self, compounds: List[str], pit_laps: List[int]) -> float:
+
+        bounds = self.stint_bounds(pit_laps)
+
+        total_time = (len(bounds) - 1) * self.pit_delta
+        for compound, (first_lap, last_lap) in zip(compounds, bounds):
+            if last_lap >= first_lap:
+                total_time += self.stint_time(compound, first_lap, last_lap)
+
+        return total_time
+
+    # Evaluate a set of strategies over a grid of pit_delta x fuel_coef x degradation scale
+    # Input: strategies (list of (compounds, pit_laps)), pit_deltas (sequence of float), fuel_coefs (sequence of float),
+    #        degradation_scales (sequence of float, optional, defaults to [1.0])
+    # Output: dict with total_times (strategy x pit_delta x fuel_coef x degradation_scale), best_index and best_time
+    #         (pit_delta x fuel_coef x degradation_scale), and the grid axes
+    # Precondition: every strategy is valid
+    # Postcondition: total_times[s, i, j, k] equals strategy_time of strategy s on an engine built with
+    #                pit_deltas[i], fuel_coefs[j] and every degradation multiplied by degradation_scales[k]
+    def sweep_parameters(self, strategies: List[Tuple[List[str], List[int]]], pit_deltas, fuel_coefs, degradation_scales=None) -> Dict[str, np.ndarray]:
+
+        if degradation_scales is None:
+            degradation_scales = [1.0]
+
+        pit_deltas = np.asarray(pit_deltas, dtype=float)
+        fuel_coefs = np.asarray(fuel_coefs, dtype=float)
+        degradation_scales = np.asarray(degradation_scales, dtype=float)
+
+        # Total time is linear in each swept parameter: split every strategy into its base, wear and stop terms
+        base_time = np.zeros(len(strategies))
+        wear_time = np.zeros(len(strategies))
+        n_stops = np.zeros(len(strategies))
+        for i, (compounds, pit_laps) in enumerate(strategies):
+            bounds = self.stint_bounds(pit_laps)
+            n_stops[i] = len(bounds) - 1
+            for compound, (first_lap, last_lap) in zip(compounds, bounds):
+                length = max(last_lap - first_lap + 1, 0)
+                base_time[i] += self.parameters[compound]["base_pace"].total_seconds() * length
+                wear_time[i] += self.parameters[compound]["degradation"] * self.wear_table[length]
+
+        # Every race lap is driven once, so the fuel term is the same for all strategies
+        fuel_laps = self.fuel_table[self.race_laps]
+
+        total_times = (
+            base_time[:, None, None, None]
+            + n_stops[:, None, None, None] * pit_deltas[None, :, None, None]
+            - fuel_coefs[None, None, :, None] * fuel_laps
+            + wear_time[:, None, None, None] * degradation_scales[None, None, None, :]
+        )
+
+        return {
+            "total_times": total_times,
+            "best_index": total_times.argmin(axis=0),
+            "best_time": total_times.min(axis=0),
+            "pit_deltas": pit_deltas,
+            "fuel_coefs": fuel_coefs,
+            "degradation_scales": degradation_scales
+        }
+
+    # Build the per-lap index arrays of a strategy
+    # Input: pit_laps (list of int)
+    # Output: (stint_index, stint_laps, race_laps, n_stops) with one entry per race lap for the arrays
+    # Precondition: none
+    # Postcondition: stint_laps restarts at 1 on every pit lap, as in the lap-by-lap simulation
+    def build_lap_indices(self, pit_laps: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+
+        race_laps = np.arange(1, self.race_laps + 1)
+
+        # Pit laps outside the race are never reached, duplicates only count once
+        stops = np.unique(np.asarray(pit_laps, dtype=int))
+        stops = stops[(stops >= 1) & (stops <= self.race_laps)]
+
+        # Stint index of each lap = number of pit stops already made (pit lap included)
+        stint_index = np.searchsorted(stops, race_laps, side="right")
+        stint_start = np.concatenate(([1], stops))[stint_index]
+        stint_laps = race_laps - stint_start + 1
+
+        return stint_index, stint_laps, race_laps, len(stops)
+
+    # Look up the tyre parameters of each stint once
+    # Input: compounds (list of str)
+    # Output: (base, degradation, variance) arrays with one entry per stint
+    # Precondition: every compound exists in parameters
+    # Postcondition: arrays can be indexed with the stint_index of build_lap_indices
+    def stint_parameters(self, compounds: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        base = np.array([self.parameters[c]["base_pace"].total_seconds() for c in compounds])
+        degradation = np.array([self.parameters[c]["degradation"] for c in compounds])
+        variance = np.array([self.parameters[c]["variance"] for c in compounds])
+        return base, degradation, variance
+
+    # Compute every deterministic lap time of a strategy in one array expression
+    # Input: compounds (list of str), pit_laps (list of int)
+    # Output: (lap_times, lap_variance, n_stops), arrays with one entry per race lap
+    # Precondition: len(compounds) > number of pit laps within the race
+    # Postcondition: lap_times[i] equals compute_lap_time without noise for lap i + 1
+    def compute_lap_times(self, compounds: List[str], pit_laps: List[int]) -> Tuple[np.ndarray, np.ndarray, int]:
+
+        stint_index, stint_laps, race_laps, n_stops = self.build_lap_indices(pit_laps)
+        base, degradation, variance = self.stint_parameters(compounds[:n_stops + 1])
+
+        # Same model as compute_lap_time: tyre degradation + fuel effect
+        tyre_time = base[stint_index] + degradation[stint_index] * (np.exp(0.08 * stint_laps) - 1)
+        fuel_time = -self.fuel_coef * (self.race_laps - race_laps)
+
+        return tyre_time + fuel_time, variance[stint_index], n_stops
+
     # Simulate a race strategy
     # Input: compounds (list of str), pit_laps (list of int)
     # Output: total_time (float, seconds)
@@ -63,42 +246,124 @@ class RaceEngine:
                 f"(need at least {len(pit_laps)+1} compounds)"
             )
 
-        total_time = 0.0
-        current_stint_index = 0
-        stint_lap = 1
-        pit_lap_set = set(pit_laps)
-
-        # Simulate each lap of the race
-        for lap in range(1, self.race_laps + 1):
-
-            # Pit stop
-            if lap in pit_lap_set:
-                total_time += self.pit_delta
-                current_stint_index += 1
-                stint_lap = 1  # First lap on new tyre
-            
-            compound = compounds[current_stint_index]
-            lap_time = self.compute_lap_time(compound=compound, stint_lap=stint_lap, current_lap=lap)
-            total_time += lap_time
-            stint_lap += 1
+        # Deterministic races only need the precomputed stint sums
+        if not self.use_stochastic:
+            return self.strategy_time(compounds, pit_laps)
 
-        return total_time
+        # Evaluate the whole race at once instead of lap by lap
+        lap_times, lap_variance, n_stops = self.compute_lap_times(compounds, pit_laps)
+        lap_times = lap_times + np.random.normal(0, lap_variance)
+
+        return float(lap_times.sum() + n_stops * self.pit_delta)
+
+    # Sample safety-car and virtual safety-car periods for a batch of simulations
+    # Input: n_simulations (int), rng (np.random.Generator)
+    # Output: (sc, vsc) boolean masks of shape (n_simulations, race_laps)
+    # Precondition: self.neutralization is set
+    # Postcondition: a lap is never under SC and VSC at the same time (SC wins)
+    def sample_neutralizations(self, n_simulations: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+
+        model = self.neutralization
+        laps = np.arange(self.race_laps)
+
+        # A single uniform draw per lap decides the start of a period and, rescaled, its duration
+        u = rng.random((n_simulations, self.race_laps))
+
+        # Lap covered by a period if one started at or before it and has not ended yet
+        def covered(low: float, rate: float, duration: Tuple[int, int]) -> np.ndarray:
+            if rate <= 0:
+                return np.zeros(u.shape, dtype=bool)
+            started = (u >= low) & (u < low + rate)
+            length = duration[0] + np.floor((u - low) / rate * (duration[1] - duration[0] + 1))
+            end = np.where(started, laps + length, 0)
+            return np.maximum.accumulate(end, axis=1) > laps
+
+        sc = covered(0.0, model["sc_rate"], model["sc_duration"])
+        vsc = covered(model["sc_rate"], model["vsc_rate"], model["vsc_duration"]) & ~sc
+
+        return sc, vsc
+
+    # Total race times of a batch with SC/VSC periods applied as masks
+    # Input: lap_times, lap_variance (arrays from compute_lap_times), pit_laps (list of int), normal (standard-normal matrix),
+    #        sc, vsc (masks from sample_neutralizations)
+    # Output: np.ndarray of total race times, one per simulation
+    # Precondition: normal, sc and vsc have the same (simulations x race_laps) shape
+    # Postcondition: neutralized laps run at a fixed multiple of the predicted pace, pit stops made under them cost less
+    def _neutralized_totals(self, lap_times: np.ndarray, lap_variance: np.ndarray, pit_laps: List[int], normal: np.ndarray, sc: np.ndarray, vsc: np.ndarray) -> np.ndarray:
+
+        model = self.neutralization
+
+        times = lap_times + normal * lap_variance
+        times = np.where(sc, lap_times * model["sc_lap_factor"], times)
+        times = np.where(vsc, lap_times * model["vsc_lap_factor"], times)
+
+        # Effective pit loss on each pit lap
+        pit_columns = [first_lap - 1 for first_lap, _ in self.stint_bounds(pit_laps)[1:]]
+        pit_factor = np.where(sc[:, pit_columns], model["sc_pit_factor"], np.where(vsc[:, pit_columns], model["vsc_pit_factor"], 1.0))
+
+        return times.sum(axis=1) + self.pit_delta * pit_factor.sum(axis=1)
+
+    # Draw random numbers to share between strategies (common random numbers)
+    # Input: n_simulations (int), rng (np.random.Generator)
+    # Output: dict with the standard-normal "normal" matrix (n_simulations x race_laps), plus "sc" and "vsc" masks
+    #         when the engine models neutralizations
+    # Precondition: n_simulations > 0
+    # Postcondition: the dict can be passed as noise to sample_race_times for every compared strategy
+    def draw_common_noise(self, n_simulations: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        noise = {"normal": rng.standard_normal((n_simulations, self.race_laps))}
+        if self.neutralization:
+            noise["sc"], noise["vsc"] = self.sample_neutralizations(n_simulations, rng)
+        return noise
+
+    # Draw total race times for a batch of stochastic simulations
+    # Input: compounds (list of str), pit_laps (list of int), n_simulations (int), rng (np.random.Generator, optional),
+    #        noise (dict from draw_common_noise, optional)
+    # Output: np.ndarray of n_simulations total race times (seconds)
+    # Precondition: strategy valid, n_simulations > 0, rng or noise is given
+    # Postcondition: engine state is unchanged, results only depend on the rng state or on the shared noise
+    def sample_race_times(self, compounds: List[str], pit_laps: List[int], n_simulations: int, rng: Optional[np.random.Generator] = None, noise: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+
+        lap_times, lap_variance, _ = self.compute_lap_times(compounds, pit_laps)
+        deterministic_total = self.strategy_time(compounds, pit_laps)
+
+        # Common random numbers: scale the shared per-lap draws by this strategy's lap variance
+        if noise is not None:
+            normal = noise["normal"][:n_simulations]
+            if "sc" in noise:
+                return self._neutralized_totals(lap_times, lap_variance, pit_laps, normal, noise["sc"][:n_simulations], noise["vsc"][:n_simulations])
+            return deterministic_total + normal @ lap_variance
+
+        # Noise matrix (simulation x lap), drawn in chunks to keep memory bounded
+        totals = np.empty(n_simulations)
+        for start in range(0, n_simulations, MC_CHUNK_SIZE):
+            stop = min(start + MC_CHUNK_SIZE, n_simulations)
+            normal = rng.standard_normal((stop - start, self.race_laps))
+            if self.neutralization:
+                sc, vsc = self.sample_neutralizations(stop - start, rng)
+                totals[start:stop] = self._neutralized_totals(lap_times, lap_variance, pit_laps, normal, sc, vsc)
+            else:
+                totals[start:stop] = deterministic_total + (normal * lap_variance).sum(axis=1)
+
+        return totals
 
     # Monte Carlo Simulation, run stochastic simulation for a strategy
-    # Input: compounds (list of str), pit_laps (list of int), n_simulations (int)
+    # Input: compounds (list of str), pit_laps (list of int), n_simulations (int), seed (int, optional), rng (np.random.Generator, optional)
     # Output: dict with mean_time and std_time
     # Precondition: strategy valid
-    # Postcondition: returns statistical race outcome
-    def simulate_monte_carlo(self, compounds: List[str], pit_laps: List[int], n_simulations: int = 1000) -> Dict[str, float]:
+    # Postcondition: returns statistical race outcome, reproducible for a given seed or rng state
+    def simulate_monte_carlo(self, compounds: List[str], pit_laps: List[int], n_simulations: int = 1000, seed: Optional[int] = None, rng: Optional[np.random.Generator] = None) -> Dict[str, float]:
 
-        results = []
-        self.use_stochastic = True  # Enable stochastic lap times
+        if len(compounds) < len(pit_laps) + 1:
+            raise ValueError(
+                f"Not enough compounds for the strategy: "
+                f"{len(compounds)} compounds, {len(pit_laps)} pit stops "
+                f"(need at least {len(pit_laps)+1} compounds)"
+            )
 
-        # Run multiple simulations and collect total times
-        for _ in range(n_simulations):
-            total = self.simulate_strategy(compounds, pit_laps)
-            results.append(total)
+        # Explicit generator: no global RNG and no use_stochastic flip on the shared engine
+        if rng is None:
+            rng = np.random.default_rng(seed)
 
-        self.use_stochastic = False # Reset to deterministic mode
+        results = self.sample_race_times(compounds, pit_laps, n_simulations, rng)
 
-        return {"mean_time": float(np.mean(results)), "std_time": float(np.std(results))}
\ No newline at end of file
+        return {"mean_time": float(np.mean(results)), "std_time": float(np.std(results))}
@@ -10,6 +10,7 @@ import numpy as np
 import pandas as pd
 import fastf1.plotting
 from typing import Tuple
+from src.diagnostics import metrics as dm
 
 # === Constants ===
 # Speed comparison plot constants
@@ -32,6 +33,7 @@ TRACK_LINEWIDTH = 2.5  # linewidth for track plotting
 # Output: none
 # Precondition: none
 # Postcondition: speed comparison plot is displayed
+@dm.timed("plot.speed_comparison")
 def plot_speed_comparison(
     tel1: pd.DataFrame,
     tel2: pd.DataFrame,
@@ -109,6 +111,7 @@ def rotate(xy: np.ndarray, *, angle: float) -> np.ndarray:
 # Output: none
 # Precondition: none
 # Postcondition: circuit map is displayed
+@dm.timed("plot.circuit_map")
 def plot_circuit_map(circuit_info: object, session: object, THEME: dict) -> plt.Figure:
     # === Setup figure ===
     fig, ax = plt.subplots(figsize=(8, 8))
@@ -187,6 +190,7 @@ def plot_circuit_map(circuit_info: object, session: object, THEME: dict) -> plt.
     return fig
 
 #
+@dm.timed("plot.position_changes")
 def plot_position_changes(session: object) -> plt.Figure:
 
     # Setup FastF1 plotting style
@@ -198,9 +202,14 @@ def plot_position_changes(session: object) -> plt.Figure:
         drv_laps = session.laps.pick_drivers(drv)
 
         abb = drv_laps['Driver'].iloc[0]
-        style = fastf1.plotting.get_driver_style(identifier=abb,
-                                                style=['color', 'linestyle'],
-                                                session=session)
+
+        # Driver styles need the full FastF1 session (team data), sessions from the lap store carry the styles saved at export
+        if isinstance(session, fastf1.core.Session):
+            style = fastf1.plotting.get_driver_style(identifier=abb,
+                                                    style=['color', 'linestyle'],
+                                                    session=session)
+        else:
+            style = session.driver_styles.get(abb, {})
 
         ax.plot(drv_laps['LapNumber'], drv_laps['Position'],
                 label=abb, **style)